@@ -5,32 +5,163 @@
 import subprocess
 import sys
 import os
+import argparse
+import ast
+import base64
+import csv
+import functools
+import glob
+import hashlib
+import importlib.util
+import io
+import json
+import py_compile
+import queue
+import re
+import shutil
+import signal
+import socket
+import socketserver
+import statistics
+import struct
+import sysconfig
+import tempfile
+import threading
+import time
+import urllib.parse
+import xmlrpc.client
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import pkg_resources
 import pyttsx3
 import requests
 import speech_recognition as sr
 
+# Local state kept by the tool: cached wheels and pre-upgrade snapshots
+PIP_TOOLS_HOME = os.path.join(os.path.expanduser("~"), ".pip_tools")
+# State describing one environment is kept apart for every interpreter prefix (venv)
+ENVIRONMENT_PREFIX = os.path.realpath(sys.prefix)
+ENVIRONMENT_HOME = os.path.join(PIP_TOOLS_HOME, "envs",
+                                hashlib.sha256(ENVIRONMENT_PREFIX.encode("utf-8")).hexdigest()[:16])
+ARTIFACT_CACHE = os.path.join(ENVIRONMENT_HOME, "wheels")
+SNAPSHOT_DIR = os.path.join(ENVIRONMENT_HOME, "snapshots")
+PROXY_CACHE = os.path.join(PIP_TOOLS_HOME, "proxy")
+# Number of pre-upgrade snapshots kept, cached wheels only they refer to are removed with them
+SNAPSHOT_RETENTION = 5
+INVENTORY_FILE = os.path.join(ENVIRONMENT_HOME, "inventory.json")
+IMPORT_PROFILE_FILE = os.path.join(ENVIRONMENT_HOME, "importtime.json")
+DAEMON_SOCKET = os.path.join(ENVIRONMENT_HOME, "daemon.sock")
+LATEST_VERSIONS_FILE = os.path.join(ENVIRONMENT_HOME, "latest.json")
+# Seconds between changelog checks of the index watcher, older latest versions are synced before use
+INDEX_WATCH_INTERVAL = 300
+
+# Package index queried by the tool, point it at a proxy index with use_proxy_index()
+PYPI_URL = os.environ.get("PIP_TOOLS_INDEX", "https://pypi.org")
+SIMPLE_JSON = "application/vnd.pypi.simple.v1+json"
+
+# Background jobs announce progress too, so all speech goes through one thread that owns the
+# TTS engine, the sapi5 engine only works on the thread that created it
+_speech_queue = queue.Queue()
+_speech_thread = None
+_speech_thread_lock = threading.Lock()
+_listen_lock = threading.Lock()
+# The TTS engine and the calibrated recognizer are created once and reused
+_tts_engine = None
+_recognizer = None
+
+def _speech_worker(ready):
+    """
+    Creates the TTS engine and speaks queued text until the program exits.
+    """
+    global _tts_engine
+    try:
+        if os.name == "nt":
+            import comtypes
+            comtypes.CoInitialize()
+        _tts_engine = pyttsx3.init("sapi5")
+        voices = _tts_engine.getProperty("voices")
+        _tts_engine.setProperty("voice", voices[1].id)
+        _tts_engine.setProperty("rate",180)
+    except Exception as e:
+        ready["error"] = e
+    ready["event"].set()
+    while True:
+        text, done = _speech_queue.get()
+        try:
+            if _tts_engine is not None:
+                _tts_engine.say(text)
+                _tts_engine.runAndWait()
+        except Exception as e:
+            print(f"Could not speak: {e}")
+        finally:
+            done.set()
+
+def start_speech():
+    """
+    Starts the speech thread and waits until its TTS engine is ready.
+
+    :raises Exception: Whatever the TTS engine raised while it was created
+    """
+    global _speech_thread
+    with _speech_thread_lock:
+        if _speech_thread is None:
+            ready = {"event": threading.Event(), "error": None}
+            _speech_thread = threading.Thread(target=_speech_worker, args=(ready,), daemon=True)
+            _speech_thread.start()
+            ready["event"].wait()
+            if ready["error"] is not None:
+                raise ready["error"]
+
 def speak(text):
     """
     Uses text-to-speech to announce the given text.
     
     :param text: The text to be spoken
     """
-    engine = pyttsx3.init("sapi5")
-    voices = engine.getProperty("voices")
-    engine.setProperty("voice", voices[1].id)
-    engine.setProperty("rate",180)
-    engine.say(text)
-    engine.runAndWait()
+    start_speech()
+    done = threading.Event()
+    _speech_queue.put((text, done))
+    done.wait()
     
+def _calibrated_recognizer(source):
+    """
+    Returns the shared recognizer, calibrating it against the given microphone on first use.
+
+    :param source: An open sr.Microphone
+    """
+    global _recognizer
+    if _recognizer is None:
+        _recognizer = sr.Recognizer()
+        _recognizer.adjust_for_ambient_noise(source)
+    return _recognizer
+
+def warm_voice_backends():
+    """
+    Creates the TTS engine and calibrates the recognizer ahead of time where the backends exist.
+
+    :return: A dict telling whether "speech" and "microphone" are ready.
+    """
+    ready = {"speech": False, "microphone": False}
+    try:
+        start_speech()
+        ready["speech"] = _tts_engine is not None
+    except Exception as e:
+        print(f"Text-to-speech is not available: {e}")
+    try:
+        with _listen_lock, sr.Microphone() as source:
+            _calibrated_recognizer(source)
+        ready["microphone"] = True
+    except Exception as e:
+        print(f"No microphone to calibrate: {e}")
+    return ready
+
 def listen():
     """
     Listens for verbal input and returns the recognized text.
     """
-    recognizer = sr.Recognizer()
-    with sr.Microphone() as source:
-        
-        recognizer.adjust_for_ambient_noise(source)
+    with _listen_lock, sr.Microphone() as source:
+        recognizer = _calibrated_recognizer(source)
         print("Listening...")
         try:
             audio = recognizer.listen(source, timeout=5)  # Listening timeout
@@ -52,7 +183,7 @@ def check_pip_version():
     Checks if there is a newer version of pip available.
     """
     current_version = pkg_resources.get_distribution("pip").version
-    response = requests.get("https://pypi.org/pypi/pip/json")
+    response = requests.get(f"{PYPI_URL}/pypi/pip/json")
     latest_version = response.json()["info"]["version"]
     
     if current_version != latest_version:
@@ -76,26 +207,555 @@ def list_installed_packages():
         print(package)
     speak(f"There are {len(package_list)} installed packages.")
     print(f"\nTotal installed packages: {len(package_list)}")
+
+def canonicalize_name(name):
+    """
+    Normalizes a distribution name as described in PEP 503.
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+def _read_metadata_file(path):
+    """
+    Returns the text of a metadata file, or an empty string if it does not exist.
+    """
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+def _applicable_requirements(lines):
+    """
+    Returns the canonical names of the requirements that apply on this platform without extras.
+    """
+    names = []
+    for line in lines:
+        parts = _split_requirement(line)
+        if parts is None:
+            continue
+        if parts[4] is None or _marker_applies(parts[4]):
+            names.append(canonicalize_name(parts[0]))
+    return names
+
+@functools.lru_cache(maxsize=None)
+def _marker_applies(marker):
+    """
+    Evaluates a PEP 508 environment marker for this interpreter, without extras.
+    """
+    try:
+        return pkg_resources.Requirement.parse(f"marker; {marker}").marker.evaluate({"extra": ""})
+    except Exception:
+        return False
+
+def _scan_distribution(location, entry):
+    """
+    Reads the facts kept in the installed index from one dist-info or egg-info directory,
+    or from an egg-info file holding only the PKG-INFO of a distutils or distro install.
+    """
+    path = os.path.join(location, entry)
+    if entry.endswith(".egg-info") and not os.path.isdir(path):
+        metadata = _read_metadata_file(path)
+        headers = [line.split(":", 1) for line in metadata.split("\n\n", 1)[0].splitlines() if ":" in line]
+        # Metadata 1.1 Requires headers name modules rather than distributions
+        requires = []
+        files = [[entry]]
+        base = location
+    elif entry.endswith(".dist-info"):
+        metadata = _read_metadata_file(os.path.join(path, "METADATA"))
+        headers = [line.split(":", 1) for line in metadata.split("\n\n", 1)[0].splitlines() if ":" in line]
+        requires = _applicable_requirements(value.strip() for key, value in headers if key == "Requires-Dist")
+        files = list(csv.reader(_read_metadata_file(os.path.join(path, "RECORD")).splitlines()))
+        base = location
+    else:
+        metadata = _read_metadata_file(os.path.join(path, "PKG-INFO"))
+        headers = [line.split(":", 1) for line in metadata.split("\n\n", 1)[0].splitlines() if ":" in line]
+        requires_txt = _read_metadata_file(os.path.join(path, "requires.txt")).split("\n[", 1)[0]
+        requires = _applicable_requirements(line for line in requires_txt.splitlines() if line.strip())
+        files = [[line] for line in _read_metadata_file(os.path.join(path, "installed-files.txt")).splitlines()]
+        base = path
+    info = {key: value.strip() for key, value in headers}
+    if "Name" not in info:
+        return None
+
+    modules = _read_metadata_file(os.path.join(path, "top_level.txt")).split()
+    size = 0
+    for row in files:
+        if not row or not row[0]:
+            continue
+        if len(row) > 2 and row[2]:
+            size += int(row[2])
+        else:
+            try:
+                size += os.path.getsize(os.path.join(base, row[0]))
+            except OSError:
+                pass
+        if not modules and base == location:
+            top = row[0].split("/", 1)[0]
+            if not top.endswith((".dist-info", ".data", ".pth")) and not top.startswith(".."):
+                if "/" in row[0] or top.endswith((".py", ".so", ".pyd")):
+                    modules.append(top.split(".", 1)[0])
+    return {
+        "name": canonicalize_name(info["Name"]),
+        "project_name": info["Name"],
+        "version": info.get("Version", ""),
+        "location": location,
+        "modules": sorted(set(module for module in modules if module and module != "__pycache__")),
+        "requires": sorted(set(requires)),
+        "size": size,
+    }
+
+class InstalledIndex:
+    """
+    Persistent index of installed distributions, their import names, reverse dependencies
+    and disk usage. Only dist-info directories that changed since the last refresh are re-read.
+    """
+
+    def __init__(self, path=INVENTORY_FILE):
+        """
+        :param path: File the index is persisted to
+        """
+        self.path = path
+        self.entries = {}
+        try:
+            with open(path, "r") as f:
+                self.entries = json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            pass
+        self.refresh()
+
+    def refresh(self):
+        """
+        Re-reads dist-info directories added or changed since the last refresh.
+
+        :return: The number of distributions that were re-read or removed.
+        """
+        seen = {}
+        for location in sys.path:
+            location = os.path.abspath(location or os.getcwd())
+            try:
+                with os.scandir(location) as scan:
+                    entries = [entry for entry in scan if entry.name.endswith((".dist-info", ".egg-info"))]
+            except OSError:
+                continue
+            for entry in entries:
+                key = os.path.join(location, entry.name)
+                if key in seen:
+                    continue
+                try:
+                    stamp = entry.stat().st_mtime_ns
+                except OSError:
+                    continue
+                seen[key] = stamp
+
+        changed = 0
+        for key in [key for key in self.entries if key not in seen]:
+            del self.entries[key]
+            changed += 1
+        for key, stamp in seen.items():
+            cached = self.entries.get(key)
+            if cached is not None and cached["stamp"] == stamp:
+                continue
+            dist = _scan_distribution(os.path.dirname(key), os.path.basename(key))
+            if dist is None:
+                continue
+            dist["stamp"] = stamp
+            self.entries[key] = dist
+            changed += 1
+
+        self._build_lookups()
+        if changed:
+            self.save()
+        return changed
+
+    def _build_lookups(self):
+        """
+        Builds the in-memory tables the queries are answered from.
+        """
+        self.distributions = {}
+        # Earlier sys.path entries shadow later ones, like they do for imports
+        paths = [os.path.abspath(path or os.getcwd()) for path in sys.path]
+        rank = {path: len(paths) - position for position, path in enumerate(reversed(paths))}
+        for key in sorted(self.entries, key=lambda key: rank.get(os.path.dirname(key), len(paths)), reverse=True):
+            dist = self.entries[key]
+            self.distributions[dist["name"]] = dist
+        self.providers = {}
+        self.dependents = {}
+        for dist in self.distributions.values():
+            for module in dist["modules"]:
+                self.providers.setdefault(module, []).append(dist["name"])
+            for requirement in dist["requires"]:
+                self.dependents.setdefault(requirement, []).append(dist["name"])
+
+    def save(self):
+        """
+        Writes the index to disk.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.part"
+        with open(temp_path, "w") as f:
+            json.dump({"entries": self.entries}, f)
+        os.replace(temp_path, self.path)
+
+    def provider_of(self, module):
+        """
+        :param module: Import name, e.g. yaml or sklearn.linear_model
+        :return: Sorted names of the distributions that provide the top-level module.
+        """
+        return sorted(self.providers.get(module.split(".", 1)[0], []))
+
+    def dependents_of(self, package):
+        """
+        :param package: Distribution name
+        :return: Sorted names of the installed distributions that depend on the package.
+        """
+        return sorted(self.dependents.get(canonicalize_name(package), []))
+
+    def disk_usage(self, limit=None):
+        """
+        :param limit: Number of distributions to return, all by default
+        :return: A list of (name, bytes) tuples, largest first.
+        """
+        usage = sorted(((dist["size"], name) for name, dist in self.distributions.items()), reverse=True)
+        return [(name, size) for size, name in usage[:limit]]
+
+_installed_index = None
+_installed_index_lock = threading.Lock()
+
+def get_installed_index():
+    """
+    Returns the shared installed index, refreshed against the current dist-info directories.
+    """
+    global _installed_index
+    with _installed_index_lock:
+        if _installed_index is None:
+            _installed_index = InstalledIndex()
+        else:
+            _installed_index.refresh()
+        return _installed_index
+
+def find_package_for_module(module):
+    """
+    Announces which installed distributions provide an import name.
+
+    :param module: The import name, e.g. cv2
+    :return: A list of distribution names.
+    """
+    providers = get_installed_index().provider_of(module)
+    if providers:
+        speak(f"{module} is provided by {', '.join(providers)}.")
+        print(f"{module} is provided by: {', '.join(providers)}")
+    else:
+        speak(f"No installed package provides {module}.")
+        print(f"No installed package provides {module}.")
+    return providers
+
+def list_dependents(package):
+    """
+    Lists the installed packages that depend on a package.
+
+    :param package: The distribution name, e.g. numpy
+    :return: A list of distribution names.
+    """
+    dependents = get_installed_index().dependents_of(package)
+    speak(f"{len(dependents)} installed packages depend on {package}.")
+    print(f"\nPackages depending on {package}:")
+    for dependent in dependents:
+        print(dependent)
+    return dependents
+
+def list_disk_usage(limit=20):
+    """
+    Lists the installed packages using the most disk space.
+
+    :param limit: Number of packages to list
+    :return: A list of (name, bytes) tuples, largest first.
+    """
+    index = get_installed_index()
+    usage = index.disk_usage(limit)
+    total = sum(dist["size"] for dist in index.distributions.values())
+    speak(f"Installed packages use {total / 1024 ** 3:.1f} gigabytes.")
+    print(f"\nLargest installed packages ({total / 1024 ** 2:.0f} MB in total):")
+    for name, size in usage:
+        print(f"{size / 1024 ** 2:10.1f} MB  {name}")
+    return usage
+
+# Imports one module in a fresh interpreter and prints its peak memory in bytes, if the platform reports it
+_IMPORT_PROBE = """
+import sys
+__import__(sys.argv[1])
+peak = ""
+try:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+except ImportError:
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (field, ctypes.c_size_t) for field in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(wintypes.HANDLE(process), ctypes.byref(counters), counters.cb):
+            peak = counters.PeakWorkingSetSize
+    except (ImportError, AttributeError, OSError):
+        pass
+print(f"pip-tools-peak={peak}")
+"""
+
+def parse_importtime(output):
+    """
+    Parses the output of python -X importtime.
+
+    :param output: The stderr of the profiled interpreter
+    :return: A dictionary mapping module names to (self, cumulative) microseconds.
+    """
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        times[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+    return times
+
+def _profile_module(module, timeout):
+    """
+    Imports a module in its own interpreter with -X importtime.
+
+    :return: A tuple of (self microseconds, cumulative microseconds, peak bytes or None when the
+             platform does not report it), or None if the import failed.
+    """
+    command = [sys.executable, '-X', 'importtime', '-c', _IMPORT_PROBE, module]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None
+    if result.returncode != 0:
+        return None
+    peaks = re.findall(r"^pip-tools-peak=(\d*)$", result.stdout, re.MULTILINE)
+    peak = int(peaks[-1]) if peaks and peaks[-1] else None
+    times = parse_importtime(result.stderr)
+    if module not in times:
+        return 0, 0, peak
+    own = sum(self_us for name, (self_us, _) in times.items() if name == module or name.startswith(module + "."))
+    return own, times[module][1], peak
+
+def profile_import_times(max_workers=None, timeout=120, regression=0.2, min_regression_ms=5.0, repeats=3):
+    """
+    Imports every installed top-level module in isolated subprocesses and ranks the
+    distributions by import time. Results are saved and compared with the previous run.
+
+    :param max_workers: Number of imports run in parallel, defaults to the number of cores
+    :param timeout: Seconds a single import may take
+    :param regression: Relative growth of cumulative import time that is flagged as a regression
+    :param min_regression_ms: Smallest growth in milliseconds that is flagged, whatever the relative growth
+    :param repeats: Number of runs a suspected regression is measured with, the fastest counts
+    :return: A list of result dictionaries, slowest first.
+    """
+    distributions = get_installed_index().distributions
+    jobs = [(dist["name"], module) for dist in distributions.values()
+            for module in dist["modules"] if module not in ("test", "tests")]
+    baseline = _profile_module("sys", timeout)
+    baseline_memory = baseline[2] if baseline and baseline[2] is not None else 0
+
+    speak(f"Profiling {len(jobs)} modules.")
+    print(f"Profiling imports of {len(jobs)} modules...")
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        futures = {executor.submit(_profile_module, module, timeout): (name, module) for name, module in jobs}
+        for future in as_completed(futures):
+            name, module = futures[future]
+            result = results.setdefault(name, {"name": name, "version": distributions[name]["version"],
+                                               "self_ms": 0.0, "cumulative_ms": 0.0, "memory_mb": None,
+                                               "failed": []})
+            timing = future.result()
+            if timing is None:
+                result["failed"].append(module)
+                continue
+            result["self_ms"] += timing[0] / 1000
+            result["cumulative_ms"] += timing[1] / 1000
+            if timing[2] is not None:
+                result["memory_mb"] = max(result["memory_mb"] or 0.0, (timing[2] - baseline_memory) / 1024 ** 2)
+
+    previous = {}
+    try:
+        with open(IMPORT_PROFILE_FILE, "r") as f:
+            previous = {result["name"]: result for result in json.load(f)["results"]}
+    except (OSError, ValueError, KeyError):
+        pass
+
+    def regressed(result):
+        before = previous.get(result["name"])
+        return bool(before and before["cumulative_ms"] > 0 and not result["failed"]
+                    and result["cumulative_ms"] - before["cumulative_ms"] >= min_regression_ms
+                    and result["cumulative_ms"] > before["cumulative_ms"] * (1 + regression))
+
+    def remeasure(name):
+        total = 0.0
+        for module in modules[name]:
+            timing = _profile_module(module, timeout)
+            if timing is None:
+                return None
+            total += timing[1] / 1000
+        return total
+
+    # A single sample is noisy, suspected regressions are measured again and the fastest run counts
+    modules = {}
+    for name, module in jobs:
+        modules.setdefault(name, []).append(module)
+    suspects = [result["name"] for result in results.values() if regressed(result)]
+    if suspects and repeats > 1:
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            for _ in range(repeats - 1):
+                for name, total in zip(suspects, executor.map(remeasure, suspects)):
+                    if total is not None:
+                        results[name]["cumulative_ms"] = min(results[name]["cumulative_ms"], total)
+    ranked = sorted(results.values(), key=lambda result: result["cumulative_ms"], reverse=True)
+    for result in ranked:
+        result["regressed"] = regressed(result)
+    os.makedirs(os.path.dirname(IMPORT_PROFILE_FILE), exist_ok=True)
+    with open(IMPORT_PROFILE_FILE, "w") as f:
+        json.dump({"created": time.time(), "results": ranked}, f, indent=1)
+
+    print(f"\n{'cumulative':>12} {'self':>10} {'memory':>10}  package")
+    for result in ranked:
+        memory = "unknown" if result["memory_mb"] is None else f"{result['memory_mb']:.1f}MB"
+        line = (f"{result['cumulative_ms']:10.1f}ms {result['self_ms']:8.1f}ms "
+                f"{memory:>10}  {result['name']}=={result['version']}")
+        before = previous.get(result["name"])
+        if result["regressed"]:
+            line += f"  REGRESSED from {before['cumulative_ms']:.1f}ms ({before['version']})"
+        if result["failed"]:
+            line += f"  failed: {', '.join(result['failed'])}"
+        print(line)
+    if ranked:
+        slowest = ", ".join(result["name"] for result in ranked[:3])
+        speak(f"The slowest imports are {slowest}.")
+    regressed = [result["name"] for result in ranked if result["regressed"]]
+    if regressed:
+        speak(f"{len(regressed)} packages got slower to import since the last profile.")
+        print(f"\nSlower to import since the last profile: {', '.join(regressed)}")
+    return ranked
+
+# Packages pruning never removes: pip itself and what this tool needs to run
+PROTECTED_PACKAGES = ["pip", "setuptools", "wheel", "pyttsx3", "requests", "speechrecognition", "pyaudio"]
+SKIPPED_DIRECTORIES = {".git", ".hg", ".svn", ".tox", ".nox", ".venv", "venv", "env", "__pycache__",
+                       "site-packages", "node_modules", "build", "dist"}
+
+def _file_imports(path):
+    """
+    Returns the top-level names a Python source file imports.
+    """
+    try:
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read(), filename=path)
+    except (OSError, SyntaxError, ValueError):
+        return set()
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split(".", 1)[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.add(node.module.split(".", 1)[0])
+    return names
+
+def scan_project_imports(project_dir, max_workers=None):
+    """
+    Collects the top-level imports of every Python file below a project directory.
+
+    :param project_dir: Root of the project tree
+    :param max_workers: Number of processes parsing files
+    :return: A set of module names.
+    """
+    paths = []
+    for root, directories, files in os.walk(project_dir):
+        directories[:] = [directory for directory in directories if directory not in SKIPPED_DIRECTORIES]
+        paths.extend(os.path.join(root, name) for name in files if name.endswith(".py"))
+    imports = set()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for names in executor.map(_file_imports, paths, chunksize=64):
+            imports.update(names)
+    return imports
+
+def find_unused_packages(project_dir, max_workers=None):
+    """
+    Finds the installed packages that are unreachable from a project's imports and their dependencies.
+
+    :param project_dir: Root of the project tree
+    :param max_workers: Number of processes parsing files
+    :return: A sorted list of distribution names.
+    """
+    index = get_installed_index()
+    reachable = set()
+    pending = [canonicalize_name(name) for name in PROTECTED_PACKAGES]
+    for module in scan_project_imports(project_dir, max_workers):
+        pending.extend(index.provider_of(module))
+    while pending:
+        name = pending.pop()
+        if name in reachable or name not in index.distributions:
+            continue
+        reachable.add(name)
+        pending.extend(index.distributions[name]["requires"])
+    return sorted(name for name in index.distributions if name not in reachable)
+
+def _inventory_scan_time():
+    """
+    Returns the seconds pkg_resources needs to scan the installed distributions.
+    """
+    start = time.perf_counter()
+    pkg_resources.WorkingSet()
+    return time.perf_counter() - start
+
+def prune_packages(project_dir, uninstall=False):
+    """
+    Reports the installed packages a project does not need and optionally uninstalls them in one batch.
+
+    :param project_dir: Root of the project tree
+    :param uninstall: Uninstall the unused packages
+    :return: A list of the unused distribution names.
+    """
+    unused = find_unused_packages(project_dir)
+    distributions = get_installed_index().distributions
+    reclaimable = sum(distributions[name]["size"] for name in unused)
+    speak(f"{len(unused)} installed packages are not used by the project.")
+    print(f"\nPackages not used by {project_dir}:")
+    for name in unused:
+        print(f"{distributions[name]['size'] / 1024 ** 2:10.1f} MB  {name}")
+    print(f"\n{len(unused)} unused packages, {reclaimable / 1024 ** 2:.1f} MB reclaimable")
+    if not uninstall or not unused:
+        return unused
+
+    scan_before = _inventory_scan_time()
+    try:
+        subprocess.check_call([sys.executable, '-m', 'pip', 'uninstall', '-y'] + unused)
+    except subprocess.CalledProcessError as e:
+        speak(f"Failed to uninstall the unused packages. Error: {e}")
+        print(f"Failed to uninstall the unused packages. Error: {e}")
+        return unused
+    scan_after = _inventory_scan_time()
+    remaining = get_installed_index().distributions
+    reclaimed = sum(distributions[name]["size"] for name in unused if name not in remaining)
+    speak(f"Reclaimed {reclaimed / 1024 ** 3:.1f} gigabytes.")
+    print(f"Reclaimed {reclaimed / 1024 ** 2:.1f} MB, inventory scan time "
+          f"{scan_before * 1000:.0f}ms -> {scan_after * 1000:.0f}ms")
+    return unused
+
 def check_for_upgrades():
     """
     Checks for available upgrades for installed packages.
+    Answered from the latest version table when the index watcher keeps it current.
     
     :return: A list of packages that have available upgrades.
     """
-    upgrades = []
-    installed_packages = pkg_resources.working_set
-    for package in installed_packages:
-        try:
-            # Check for available upgrades using pip
-            command = [sys.executable, '-m', 'pip', 'list', '--outdated', '--format=freeze']
-            outdated = subprocess.check_output(command).decode('utf-8').strip().split('\n')
-            for line in outdated:
-                if line:
-                    pkg_name = line.split('==')[0]
-                    upgrades.append(pkg_name)
-        except subprocess.CalledProcessError as e:
-            print(f"Error checking for upgrades: {e}")
-    return upgrades
+    return [name for name, installed, latest in find_outdated_packages()]
 
 def search_packages(query):
     """
@@ -103,7 +763,7 @@ def search_packages(query):
     
     :param query: The search term for the package name.
     """
-    response = requests.get(f"https://pypi.org/pypi?%3Aaction=search&term={query}&submit=search")
+    response = requests.get(f"{PYPI_URL}/pypi?%3Aaction=search&term={query}&submit=search")
     if response.status_code == 200:
         results = response.json().get('hits', {}).get('hits', [])
         if results:
@@ -123,790 +783,2714 @@ def search_packages(query):
         print("Error occurred while searching for packages.")
         return []
 
-def upgrade_packages():
+def upgrade_packages(upgrade_pip=None, bytecode="pip"):
     """
     Upgrades all installed packages using pip.
+    The installed set is snapshotted first so the upgrade can be rolled back offline.
+
+    :param upgrade_pip: Whether to upgrade pip first, asks the user when None
+    :param bytecode: When .pyc files are written, see compile_changed_distributions()
     """
-    if check_pip_version():
+    print("Saving a snapshot of the installed packages...")
+    snapshot_path = create_upgrade_snapshot()
+    print(f"Snapshot saved to {snapshot_path}")
+
+    if upgrade_pip is None and check_pip_version():
         speak("Would you like to upgrade pip now?")
-        response = listen()
-        if "yes" in response:
-            try:
-                #speak("Upgrading pip...")
-                print("Upgrading pip...")
-                subprocess.check_call([sys.executable, '-m', 'pip', 'install', '--upgrade', 'pip'])
-                #speak("Successfully upgraded pip.")
-                print("Successfully upgraded pip.")
-            except subprocess.CalledProcessError as e:
-                speak(f"Failed to upgrade pip. Error: {e}")
-                print(f"Failed to upgrade pip. Error: {e}")
+        upgrade_pip = "yes" in listen()
+    if upgrade_pip:
+        try:
+            #speak("Upgrading pip...")
+            print("Upgrading pip...")
+            run_pip_command([sys.executable, '-m', 'pip', 'install', '--upgrade', 'pip'])
+            #speak("Successfully upgraded pip.")
+            print("Successfully upgraded pip.")
+        except subprocess.CalledProcessError as e:
+            speak(f"Failed to upgrade pip. Error: {e}")
+            print(f"Failed to upgrade pip. Error: {e}")
 
+    before = dict(get_installed_index().entries)
     installed_packages = pkg_resources.working_set
     for package in installed_packages:
         try:
             #speak(f"Upgrading {package.key}...")
             print(f"Upgrading {package.key}...")
             command = [sys.executable, '-m', 'pip', 'install', '--upgrade', package.key]
-            subprocess.check_call(command)
+            command.extend(_bytecode_options(bytecode))
+            run_pip_command(command)
             #speak(f"Successfully upgraded {package.key}.")
             print(f"Successfully upgraded {package.key}")
         except subprocess.CalledProcessError as e:
             speak(f"Failed to upgrade {package.key}. Error: {e}")
             print(f"Failed to upgrade {package.key}. Error: {e}")
+    if bytecode == "deferred":
+        compile_changed_distributions(before)
 
-def install_packages(package_list, requirements_file=None):
+def install_packages(package_list, requirements_file=None, bytecode="pip"):
     """
     Installs a list of packages using pip.
 
     :param package_list: List of package names to install
     :param requirements_file: Path to a requirements file
+    :param bytecode: When .pyc files are written, see compile_changed_distributions()
     """
+    options = []
+    constraints = []
     if requirements_file:
         if os.path.exists(requirements_file):
-            with open(requirements_file, 'r') as f:
-                package_list = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+            package_list, constraints, options = parse_requirements_file(requirements_file)
         else:
             print(f"Requirements file {requirements_file} does not exist.")
             return
 
-    for package in package_list:
+    before = dict(get_installed_index().entries)
+    # In hash-checking mode pip needs every requirement of the run in one file
+    hashed = "--require-hashes" in options or any("--hash" in line for line in package_list)
+    batches = [package_list] if hashed and package_list else [[package] for package in package_list]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Constraints on packages that are not listed apply to the dependencies of every run
+        if constraints:
+            constraints_path = os.path.join(temp_dir, "constraints.txt")
+            with open(constraints_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(constraints) + "\n")
+            options = options + ["-c", constraints_path]
+        for batch in batches:
+            package = batch[0] if len(batch) == 1 else f"{len(batch)} hashed requirements"
+            try:
+                #speak(f"Installing {package}...")
+                print(f"Installing {package}...")
+                command = [sys.executable, '-m', 'pip', 'install']
+                command.extend(options)
+                command.extend(_bytecode_options(bytecode))
+                command.extend(_requirement_arguments(batch, temp_dir))
+                run_pip_command(command)
+                #speak(f"Successfully installed {package}.")
+                print(f"Successfully installed {package}")
+            except subprocess.CalledProcessError as e:
+                speak(f"Failed to install {package}. Error: {e}")
+                print(f"Failed to install {package}. Error: {e}")
+    if bytecode == "deferred":
+        compile_changed_distributions(before)
+
+def _bytecode_options(bytecode):
+    """
+    Returns the pip options for a bytecode mode.
+    """
+    if bytecode not in ("pip", "deferred", "lazy"):
+        raise ValueError(f"Unknown bytecode mode {bytecode!r}")
+    return ['--no-compile'] if bytecode != "pip" else []
+
+def _pyc_is_current(path):
+    """
+    Checks whether the cached bytecode of a source file matches its mtime and size, like compileall does.
+    """
+    try:
+        with open(importlib.util.cache_from_source(path), "rb") as f:
+            header = f.read(16)
+        source = os.stat(path)
+    except OSError:
+        return False
+    return (len(header) == 16 and header[:4] == importlib.util.MAGIC_NUMBER
+            and int.from_bytes(header[4:8], "little") == 0
+            and int.from_bytes(header[8:12], "little") == int(source.st_mtime) & 0xFFFFFFFF
+            and int.from_bytes(header[12:16], "little") == source.st_size & 0xFFFFFFFF)
+
+def _compile_source(path):
+    """
+    Compiles one source file unless its bytecode is current.
+
+    :return: Seconds spent compiling, or None if the file was skipped or failed to compile.
+    """
+    if _pyc_is_current(path):
+        return None
+    start = time.perf_counter()
+    try:
+        py_compile.compile(path, doraise=True)
+    except (py_compile.PyCompileError, OSError, ValueError):
+        return None
+    return time.perf_counter() - start
+
+def compile_changed_distributions(before, max_workers=None):
+    """
+    Compiles the sources of every distribution installed or changed since an earlier
+    state of the installed index in one pass on a process pool.
+
+    Installs and upgrades take a bytecode mode: "pip" lets pip compile each package serially
+    while installing it, "deferred" installs with --no-compile and calls this function once
+    at the end, and "lazy" installs with --no-compile and leaves compilation to the first import.
+
+    :param before: The installed index entries from before the installs
+    :param max_workers: Number of compiling processes, defaults to the number of cores
+    :return: A tuple of (files compiled, wall clock seconds, seconds saved compared to compiling serially).
+    """
+    after = get_installed_index().entries
+    paths = []
+    for key, dist in after.items():
+        if key in before and before[key]["stamp"] == dist["stamp"]:
+            continue
+        if not key.endswith(".dist-info"):
+            continue
+        for row in csv.reader(_read_metadata_file(os.path.join(key, "RECORD")).splitlines()):
+            if row and row[0].endswith(".py"):
+                path = os.path.normpath(os.path.join(dist["location"], row[0]))
+                if path.startswith(dist["location"] + os.sep):
+                    paths.append(path)
+    if not paths:
+        return 0, 0.0, 0.0
+
+    max_workers = max_workers or os.cpu_count()
+    print(f"Compiling {len(paths)} files on {max_workers} processes...")
+    start = time.perf_counter()
+    durations = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for duration in executor.map(_compile_source, paths, chunksize=64):
+            try:
+                raise_if_cancelled()
+            except OperationCancelled:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            if duration is not None:
+                durations.append(duration)
+    elapsed = time.perf_counter() - start
+    saved = max(sum(durations) - elapsed, 0.0)
+    speak(f"Compiled {len(durations)} files, saving about {saved:.0f} seconds.")
+    print(f"Compiled {len(durations)} files in {elapsed:.1f}s, compiling them one by one "
+          f"would have taken {sum(durations):.1f}s ({saved:.1f}s saved)")
+    return len(durations), elapsed, saved
+
+# Requirements file options that apply to the whole pip run, and whether they take a value
+_GLOBAL_REQUIREMENT_OPTIONS = {
+    "-i": True, "--index-url": True, "--extra-index-url": True, "--no-index": False,
+    "-f": True, "--find-links": True, "--trusted-host": True, "--pre": False,
+    "--prefer-binary": False, "--require-hashes": False, "--no-binary": True, "--only-binary": True,
+}
+_LINE_OPTION = re.compile(r"\s+(--(?:hash|config-settings|global-option|install-option)(?:=|\s+)\S+)")
+_HAS_LINE_OPTION = re.compile(r"\s-")
+_INLINE_COMMENT = re.compile(r"(^|\s+)#.*$")
+_ENVIRONMENT_VARIABLE = re.compile(r"\$\{([A-Z0-9_]+)\}")
+_SIMPLE_REQUIREMENT = re.compile(
+    r"^(?P<name>[A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[(?P<extras>[^\]]*)\])?\s*"
+    r"(?P<specifiers>(?:(?:===|==|!=|~=|<=|>=|<|>)\s*[^,;\s]+\s*,?\s*)*)(?:;\s*(?P<marker>.*))?$")
+
+def _logical_lines(f):
+    """
+    Yields the logical lines of a requirements file with continuations joined and comments removed.
+    """
+    pending = ""
+    for line in f:
+        line = line.rstrip("\r\n")
+        if line.endswith("\\"):
+            pending += line[:-1]
+            continue
+        line = pending + line
+        pending = ""
+        if "#" in line:
+            line = _INLINE_COMMENT.sub("", line)
+        line = line.strip()
+        if "${" in line:
+            line = _ENVIRONMENT_VARIABLE.sub(lambda match: os.environ.get(match.group(1), match.group(0)), line)
+        if line:
+            yield line
+    if pending:
+        line = _INLINE_COMMENT.sub("", pending).strip()
+        if line:
+            yield line
+
+def iter_requirements_file(path, constraint=False, _stack=(), _seen=None):
+    """
+    Streams the entries of a requirements file, following -r and -c includes.
+    A file included several times is only read the first time.
+
+    :param path: Path to the requirements file
+    :param constraint: Whether entries of this file are constraints
+    :return: A generator of (kind, value) tuples where kind is requirement, constraint, editable or option.
+    """
+    path = os.path.realpath(path)
+    if path in _stack:
+        print(f"Skipping {path}, it includes itself through {' -> '.join(_stack)}.")
+        return
+    if _seen is None:
+        _seen = set()
+    if (path, constraint) in _seen:
+        return
+    _seen.add((path, constraint))
+    stack = _stack + (path,)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in _logical_lines(f):
+            if not line.startswith("-"):
+                yield ("constraint" if constraint else "requirement"), line
+                continue
+            if line.startswith("--") and "=" in line.split(None, 1)[0]:
+                option, _, value = line.partition("=")
+            elif not line.startswith("--") and len(line) > 2 and not line[2].isspace():
+                # Short options may be glued to their value, e.g. -rbase.txt
+                option, value = line[:2], line[2:]
+            else:
+                option, _, value = line.replace("\t", " ").partition(" ")
+            value = value.strip()
+            if option in ("-r", "--requirement", "-c", "--constraint"):
+                include = value if os.path.isabs(value) else os.path.join(os.path.dirname(path), value)
+                yield from iter_requirements_file(include, constraint or option in ("-c", "--constraint"), stack, _seen)
+            elif option in ("-e", "--editable"):
+                if not constraint:
+                    yield "editable", value
+            elif option in _GLOBAL_REQUIREMENT_OPTIONS:
+                yield "option", [option, value] if _GLOBAL_REQUIREMENT_OPTIONS[option] else [option]
+            else:
+                print(f"Ignoring unsupported requirements file option: {line}")
+
+def _split_requirement(text):
+    """
+    Splits a PEP 508 requirement into name, extras, specifiers, URL and marker.
+    Plain name and version lines are matched with a regular expression because
+    pkg_resources parses them several hundred times slower.
+
+    :return: A tuple of (name, extras, specifiers, url, marker), or None if the line is not a requirement.
+    """
+    match = _SIMPLE_REQUIREMENT.match(text)
+    if match:
+        extras = match.group("extras") or ""
+        specifiers = "".join(match.group("specifiers").split()).rstrip(",")
+        return (match.group("name"), {extra.strip() for extra in extras.split(",") if extra.strip()},
+                specifiers.split(",") if specifiers else [], None, match.group("marker"))
+    try:
+        requirement = pkg_resources.Requirement.parse(text)
+    except Exception:
+        return None
+    marker = str(requirement.marker) if requirement.marker is not None else None
+    return (requirement.project_name, set(requirement.extras),
+            [str(specifier) for specifier in requirement.specifier], requirement.url, marker)
+
+def parse_requirements_file(path):
+    """
+    Parses a requirements file with its includes and constraints. Lines whose environment markers
+    do not apply here are dropped and duplicates are merged by normalized name. Constraints on
+    listed requirements are merged into them, the others are returned for pip's -c option.
+
+    :param path: Path to the requirements file
+    :return: A tuple of the requirement lines to install, the remaining constraint lines and the pip options the files set.
+    """
+    requirements = {}
+    constraints = {}
+    verbatim = []
+    options = []
+    for kind, value in iter_requirements_file(path):
+        if kind == "option":
+            if value not in options:
+                options.append(value)
+            continue
+        if kind == "editable":
+            verbatim.append(f"-e {value}")
+            continue
+        hashes = _LINE_OPTION.findall(value) if "--" in value else []
+        parts = _split_requirement(_LINE_OPTION.sub("", value).strip() if hashes else value)
+        if parts is None:
+            # URLs and local paths are passed to pip unchanged
+            if kind == "requirement":
+                verbatim.append(value)
+            continue
+        name, extras, specifiers, url, marker = parts
+        if marker is not None and not _marker_applies(marker):
+            continue
+        target = constraints if kind == "constraint" else requirements
+        merged = target.setdefault(canonicalize_name(name),
+                                   {"name": name, "extras": set(), "specifiers": set(), "url": None, "options": []})
+        merged["extras"].update(extras)
+        merged["specifiers"].update(specifiers)
+        merged["url"] = merged["url"] or url
+        merged["options"].extend(option for option in hashes if option not in merged["options"])
+
+    def format_line(merged, extras=True):
+        line = merged["name"]
+        if extras and merged["extras"]:
+            line += f"[{','.join(sorted(merged['extras']))}]"
+        if merged["url"]:
+            line += f" @ {merged['url']}"
+        else:
+            line += ",".join(sorted(merged["specifiers"]))
+        return " ".join([line] + merged["options"])
+
+    lines = []
+    for key, merged in requirements.items():
+        if key in constraints:
+            constraint = constraints.pop(key)
+            merged["specifiers"].update(constraint["specifiers"])
+            merged["url"] = merged["url"] or constraint["url"]
+            merged["options"].extend(option for option in constraint["options"] if option not in merged["options"])
+        lines.append(format_line(merged))
+    # Constraints do not take extras
+    leftover = [format_line(merged, extras=False) for merged in constraints.values()]
+    return lines + verbatim, leftover, [part for option in options for part in option]
+
+def _requirement_arguments(requirements, temp_dir):
+    """
+    Returns the pip arguments that install lines returned by parse_requirements_file().
+    A single plain line is passed directly, anything else is written to a requirements file
+    because per-requirement options such as --hash only work inside one.
+
+    :param requirements: The lines to install in one pip run
+    :param temp_dir: Directory for the generated requirements file
+    """
+    if len(requirements) == 1:
+        requirement = requirements[0]
+        if requirement.startswith("-e "):
+            return ["-e", requirement[3:].strip()]
+        if not _HAS_LINE_OPTION.search(requirement):
+            return [requirement]
+    path = os.path.join(temp_dir, "requirements.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(requirements) + "\n")
+    return ["-r", path]
+
+def benchmark_requirements_parser(lines=50000, files=10):
+    """
+    Generates a requirements tree with includes, constraints, markers, comments, continuations
+    and hashes, and measures how fast parse_requirements_file() gets through it.
+
+    :param lines: Total number of lines in the tree
+    :param files: Number of included files
+    :return: Seconds taken to parse the tree.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        per_file = lines // (files + 1)
+        with open(os.path.join(temp_dir, "constraints.txt"), "w") as f:
+            for number in range(per_file):
+                f.write(f"package-{number % 5000}<{number % 7 + 2}.0\n")
+        for index in range(files):
+            with open(os.path.join(temp_dir, f"part{index}.txt"), "w") as f:
+                f.write("-c constraints.txt\n")
+                for number in range(per_file):
+                    name = f"package-{(index * per_file + number) % 5000}"
+                    variant = number % 5
+                    if variant == 0:
+                        f.write(f"{name}>=1.{number % 10}  # pinned for reasons\n")
+                    elif variant == 1:
+                        f.write(f'{name}[extra] ; python_version < "3.0"\n')
+                    elif variant == 2:
+                        f.write(f"{name}==1.0 \\\n    --hash=sha256:{number:064x}\n")
+                    elif variant == 3:
+                        f.write(f"# {name} is not needed any more\n")
+                    else:
+                        f.write(f'{name.upper().replace("-", "_")}!=0.{number % 3} ; sys_platform != "cygwin"\n')
+        with open(os.path.join(temp_dir, "requirements.txt"), "w") as f:
+            f.write("--index-url https://pypi.org/simple\n")
+            for index in range(files):
+                f.write(f"-r part{index}.txt\n")
+        start = time.perf_counter()
+        requirements, constraints, options = parse_requirements_file(os.path.join(temp_dir, "requirements.txt"))
+        elapsed = time.perf_counter() - start
+    print(f"Parsed {lines} lines into {len(requirements)} requirements in {elapsed * 1000:.0f}ms "
+          f"({lines / elapsed:,.0f} lines per second)")
+    return elapsed
+
+class OperationCancelled(Exception):
+    """
+    Raised inside a background job when the user cancels it.
+    """
+
+_SIZE_UNITS = {"B": 1, "kB": 1000, "KB": 1000, "MB": 1000 ** 2, "GB": 1000 ** 3}
+_PIP_PATTERNS = [
+    ("resolving", re.compile(r"^(?:Collecting|Requirement already satisfied:)\s*(?P<package>[^\s(<>=!~;]*)")),
+    ("downloading", re.compile(r"^\s*Downloading (?P<package>\S+)(?: \((?P<size>[\d.]+) (?P<unit>[kKMG]?B)\))?")),
+    ("downloading", re.compile(r"^Progress (?P<bytes>\d+) of (?P<total>\d+)")),
+    ("building", re.compile(r"^\s*(?:Building wheel for|Preparing metadata|Running setup.py install for) \(?(?P<package>[^\s)]+)")),
+    ("installing", re.compile(r"^Installing collected packages: (?P<package>.*)")),
+    ("done", re.compile(r"^Successfully installed (?P<package>.*)")),
+    ("failed", re.compile(r"^ERROR: (?P<message>.*)")),
+]
+
+def parse_pip_output(line):
+    """
+    Turns one line of pip output into a progress event.
+
+    :param line: A line pip wrote to stdout or stderr
+    :return: A dictionary with a stage and the details found on the line, or None.
+    """
+    for stage, pattern in _PIP_PATTERNS:
+        match = pattern.match(line)
+        if not match:
+            continue
+        event = {"stage": stage}
+        fields = match.groupdict()
+        if fields.get("package"):
+            event["package"] = fields["package"].strip()
+        if fields.get("size"):
+            event["total"] = int(float(fields["size"]) * _SIZE_UNITS[fields["unit"]])
+            event["bytes"] = 0
+        if fields.get("total"):
+            event["bytes"] = int(fields["bytes"])
+            event["total"] = int(fields["total"])
+        if fields.get("message"):
+            event["message"] = fields["message"]
+        return event
+    return None
+
+class ProgressReporter:
+    """
+    Combines the progress events of all pip runs of a job into one console view
+    and rate limited voice updates.
+    """
+
+    def __init__(self, description, total=None, voice_interval=60):
+        """
+        :param description: What the job does, e.g. Installing
+        :param total: Number of pip runs the job is expected to start
+        :param voice_interval: Minimum seconds between spoken updates
+        """
+        self.description = description
+        self.total = total
+        self.voice_interval = voice_interval
+        self.completed = 0
+        self.failed = []
+        self.package = None
+        self.stage = "starting"
+        self.bytes = 0
+        self.bytes_total = 0
+        self._last_voice = time.monotonic()
+        self._lock = threading.Lock()
+
+    def handle(self, event):
+        """
+        Updates the view with a progress event.
+        """
+        with self._lock:
+            stage = event["stage"]
+            if stage in ("done", "failed") and event.get("final"):
+                self.completed += 1
+                if stage == "failed":
+                    self.failed.append(self.package or "")
+                self.package = None
+            else:
+                self.stage = stage
+                if event.get("package"):
+                    self.package = event["package"]
+                if stage == "downloading":
+                    self.bytes = event.get("bytes", self.bytes)
+                    self.bytes_total = event.get("total", self.bytes_total)
+            line = self.summary()
+        print(f"\r{line[:119]:<119}", end="\n" if stage in ("done", "failed") else "", flush=True)
+        if time.monotonic() - self._last_voice >= self.voice_interval:
+            self._last_voice = time.monotonic()
+            speak(line)
+
+    def summary(self):
+        """
+        Returns a one line description of the job's progress.
+        """
+        count = f"{self.completed} of {self.total}" if self.total else f"{self.completed}"
+        line = f"{self.description}: {count} done"
+        if self.failed:
+            line += f", {len(self.failed)} failed"
+        if self.package:
+            line += f", {self.stage} {self.package}"
+        if self.stage == "downloading" and self.bytes_total:
+            line += f" {self.bytes / 1000 ** 2:.1f} of {self.bytes_total / 1000 ** 2:.1f} MB"
+        return line
+
+class PipJob:
+    """
+    Runs install or upgrade work in a background thread so the voice loop stays responsive.
+    """
+
+    def __init__(self, description, total, target, *args):
+        """
+        :param description: What the job does, e.g. Installing
+        :param total: Number of pip runs the job is expected to start
+        :param target: Function doing the work, it starts pip through run_pip_command()
+        """
+        self.reporter = ProgressReporter(description, total)
+        self.cancel_event = threading.Event()
+        self.result = None
+        self.thread = threading.Thread(target=self._run, args=(target, args), daemon=True)
+
+    def _run(self, target, args):
+        _job_context.job = self
         try:
-            #speak(f"Installing {package}...")
-            print(f"Installing {package}...")
-            command = [sys.executable, '-m', 'pip', 'install']
-            command.append(package)
-            subprocess.check_call(command)
-            #speak(f"Successfully installed {package}.")
-            print(f"Successfully installed {package}")
-        except subprocess.CalledProcessError as e:
-            speak(f"Failed to install {package}. Error: {e}")
-            print(f"Failed to install {package}. Error: {e}")
+            target(*args)
+            self.result = "cancelled" if self.cancel_event.is_set() else "finished"
+        except OperationCancelled:
+            self.result = "cancelled"
+        except Exception as e:
+            self.result = "failed"
+            print(f"\n{self.reporter.description} failed. Error: {e}")
+        speak(f"{self.reporter.description} {self.result}. {self.reporter.summary()}.")
+        print(f"\n{self.reporter.description} {self.result}. {self.reporter.summary()}.")
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def running(self):
+        return self.thread.is_alive()
+
+    def cancel(self, wait=True):
+        """
+        Stops the job, terminating the running pip process and its children.
+        """
+        self.cancel_event.set()
+        if wait:
+            self.thread.join()
+
+_job_context = threading.local()
+_active_job = None
+
+def _pip_progress_option():
+    """
+    Returns the pip option that makes download progress readable from a pipe, if pip supports it.
+    """
+    version = pkg_resources.parse_version(pkg_resources.get_distribution("pip").version)
+    return ['--progress-bar', 'raw'] if version >= pkg_resources.parse_version("24.1") else []
+
+def _terminate_process_tree(process):
+    """
+    Terminates a child process together with the processes it started.
+    """
+    if process.poll() is not None:
+        return
+    if os.name == "nt":
+        subprocess.call(['taskkill', '/F', '/T', '/PID', str(process.pid)],
+                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+def run_pip_command(command):
+    """
+    Runs a pip command like subprocess.check_call, streaming its output as progress events
+    to the running job, or to the console when there is none.
+
+    :param command: The pip command line
+    :raises subprocess.CalledProcessError: If pip fails
+    :raises OperationCancelled: If the job was cancelled while pip ran
+    """
+    job = getattr(_job_context, "job", None)
+    reporter = job.reporter if job else ProgressReporter(os.path.basename(command[-1]))
+    raise_if_cancelled()
+    if len(command) > 3 and command[3] in ("install", "download", "wheel"):
+        command = command[:4] + _pip_progress_option() + command[4:]
+    options = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP} if os.name == "nt" else {"start_new_session": True}
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, bufsize=1, **options)
+    if job:
+        def watch_for_cancel():
+            while process.poll() is None:
+                if job.cancel_event.wait(0.2):
+                    _terminate_process_tree(process)
+                    return
+        threading.Thread(target=watch_for_cancel, daemon=True).start()
+
+    errors = []
+    for line in process.stdout:
+        event = parse_pip_output(line.rstrip())
+        if event is None:
+            continue
+        if event["stage"] == "failed":
+            errors.append(event["message"])
+        else:
+            reporter.handle(event)
+    returncode = process.wait()
+    raise_if_cancelled()
+    reporter.handle({"stage": "done" if returncode == 0 else "failed", "final": True})
+    for error in errors:
+        print(f"pip: {error}")
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command)
+
+def raise_if_cancelled():
+    """
+    Stops work running inside a background job once the job has been cancelled.
+
+    :raises OperationCancelled: If the job running this code was cancelled
+    """
+    job = getattr(_job_context, "job", None)
+    if job and job.cancel_event.is_set():
+        raise OperationCancelled()
+
+def start_pip_job(description, total, target, *args):
+    """
+    Starts install or upgrade work in the background unless a job is already running.
+
+    :return: The started PipJob, or None.
+    """
+    global _active_job
+    if refuse_while_job_runs():
+        return None
+    _active_job = PipJob(description, total, target, *args).start()
+    return _active_job
+
+def refuse_while_job_runs():
+    """
+    Announces that a command changing or reading site-packages has to wait for the running job.
+
+    :return: True if an install or upgrade job is running.
+    """
+    if _active_job and _active_job.running():
+        speak("Another job is still running, say status or cancel.")
+        print("Another job is still running, say status or cancel.")
+        return True
+    return False
+
+def pip_job_status():
+    """
+    Announces the progress of the running job.
+    """
+    if _active_job is None:
+        status = "No job has been started."
+    elif _active_job.running():
+        status = _active_job.reporter.summary()
+    else:
+        status = f"{_active_job.reporter.description} {_active_job.result}. {_active_job.reporter.summary()}."
+    speak(status)
+    print(status)
+
+def cancel_pip_job():
+    """
+    Cancels the running job and waits for its pip process to exit.
+    """
+    if _active_job and _active_job.running():
+        speak("Cancelling.")
+        print("Cancelling...")
+        _active_job.cancel()
+    else:
+        speak("There is no job to cancel.")
+        print("There is no job to cancel.")
+
+def snapshot_installed_packages():
+    """
+    Returns the exact installed set.
+
+    :return: A dictionary mapping package keys to installed versions.
+    """
+    return {pkg.key: pkg.version for pkg in pkg_resources.working_set}
+
+def _wheel_tag(dist):
+    """
+    Returns the compatibility tag recorded in an installed distribution's WHEEL file.
+    """
+    if dist.has_metadata("WHEEL"):
+        for line in dist.get_metadata_lines("WHEEL"):
+            if line.startswith("Tag:"):
+                return line.split(":", 1)[1].strip()
+    return "py3-none-any"
+
+def _record_hash(path):
+    """
+    Returns the RECORD style sha256 hash and size of a file.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    encoded = base64.urlsafe_b64encode(digest.digest()).rstrip(b"=").decode("ascii")
+    return f"sha256={encoded}", size
+
+def repack_distribution(dist, wheel_dir=ARTIFACT_CACHE):
+    """
+    Re-packs the installed files of a distribution into a wheel using its RECORD.
+    Files installed outside site-packages go into the wheel's .data directory.
+    Wheels that are already cached are reused.
+
+    :param dist: The installed pkg_resources distribution
+    :param wheel_dir: Directory the wheel is written to
+    :raises ValueError: If the distribution installed files the wheel cannot restore
+    :return: Path to the wheel, or None if the distribution has no RECORD.
+    """
+    if not dist.has_metadata("RECORD"):
+        return None
+    name = re.sub(r"[-_.]+", "_", dist.project_name)
+    version = dist.version.replace("-", "_")
+    wheel_path = os.path.join(wheel_dir, f"{name}-{version}-{_wheel_tag(dist)}.whl")
+    if os.path.exists(wheel_path):
+        return wheel_path
+
+    location = os.path.normpath(dist.location)
+    scripts_dir = os.path.normpath(sysconfig.get_path("scripts"))
+    prefix_dir = os.path.normpath(sysconfig.get_path("data"))
+    data_dir = f"{name}-{version}.data"
+    record_rows = []
+    record_name = None
+    temp_path = f"{wheel_path}.{os.getpid()}.part"
+    try:
+        with zipfile.ZipFile(temp_path, "w", zipfile.ZIP_DEFLATED) as wheel:
+            for row in csv.reader(dist.get_metadata_lines("RECORD")):
+                if not row:
+                    continue
+                relative_path = row[0]
+                basename = os.path.basename(relative_path)
+                if relative_path.endswith(".dist-info/RECORD"):
+                    record_name = relative_path
+                    continue
+                if relative_path.endswith(".pyc") or basename in ("INSTALLER", "REQUESTED", "direct_url.json"):
+                    continue
+                source = os.path.normpath(os.path.join(location, relative_path))
+                if not os.path.isfile(source):
+                    continue
+                if source.startswith(location + os.sep):
+                    arcname = os.path.relpath(source, location).replace(os.sep, "/")
+                elif os.path.dirname(source) == scripts_dir:
+                    arcname = f"{data_dir}/scripts/{basename}"
+                elif source.startswith(prefix_dir + os.sep):
+                    # Headers and data files, pip installs .data/data relative to the prefix
+                    arcname = f"{data_dir}/data/" + os.path.relpath(source, prefix_dir).replace(os.sep, "/")
+                else:
+                    raise ValueError(f"{dist.key} installed {source} outside {prefix_dir}")
+                file_hash, size = _record_hash(source)
+                wheel.write(source, arcname)
+                record_rows.append((arcname, file_hash, size))
+            if record_name is None:
+                record_name = f"{name}-{version}.dist-info/RECORD"
+            record = io.StringIO()
+            writer = csv.writer(record, lineterminator="\n")
+            writer.writerows(record_rows)
+            writer.writerow((record_name, "", ""))
+            wheel.writestr(record_name, record.getvalue())
+        os.replace(temp_path, wheel_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return wheel_path
+
+def create_upgrade_snapshot(max_workers=None):
+    """
+    Records the installed set and caches a wheel of every installed distribution
+    so an upgrade can be undone without contacting the package index.
+
+    :param max_workers: Number of distributions re-packed in parallel
+    :return: Path to the snapshot file.
+    """
+    os.makedirs(ARTIFACT_CACHE, exist_ok=True)
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    packages = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(repack_distribution, dist): dist for dist in pkg_resources.working_set}
+        for future in as_completed(futures):
+            try:
+                raise_if_cancelled()
+            except OperationCancelled:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            dist = futures[future]
+            try:
+                wheel_path = future.result()
+            except (OSError, ValueError) as e:
+                print(f"Could not cache {dist.key}, it cannot be rolled back. Error: {e}")
+                wheel_path = None
+            packages[dist.key] = {"version": dist.version, "wheel": wheel_path}
+
+    snapshot_path = os.path.join(SNAPSHOT_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(snapshot_path, "w") as f:
+        json.dump({"created": time.time(), "python": sys.executable, "prefix": ENVIRONMENT_PREFIX,
+                   "packages": packages}, f, indent=1, sort_keys=True)
+    prune_snapshots()
+    return snapshot_path
+
+def prune_snapshots(keep=SNAPSHOT_RETENTION):
+    """
+    Removes all but the newest snapshots and the cached wheels no remaining snapshot refers to.
+
+    :param keep: Number of snapshots to keep
+    :return: The number of files removed.
+    """
+    snapshots = sorted(glob.glob(os.path.join(SNAPSHOT_DIR, "*.json")))
+    removed = 0
+    for snapshot_path in snapshots[:-keep] if keep else snapshots:
+        os.remove(snapshot_path)
+        removed += 1
+    referenced = set()
+    for snapshot_path in snapshots[-keep:] if keep else []:
+        try:
+            with open(snapshot_path, "r") as f:
+                packages = json.load(f)["packages"]
+        except (OSError, ValueError, KeyError):
+            continue
+        referenced.update(os.path.normpath(info["wheel"]) for info in packages.values() if info["wheel"])
+    for wheel_path in glob.glob(os.path.join(ARTIFACT_CACHE, "*.whl")):
+        if os.path.normpath(wheel_path) not in referenced:
+            os.remove(wheel_path)
+            removed += 1
+    return removed
+
+def _pip_install_wheels(wheels):
+    """
+    Installs cached wheels without contacting the package index.
+    """
+    command = [sys.executable, '-m', 'pip', 'install', '--no-index', '--no-deps',
+               '--force-reinstall', '--disable-pip-version-check']
+    command.extend(wheels)
+    subprocess.check_call(command)
+
+def rollback_packages(snapshot_path=None, max_workers=4):
+    """
+    Restores the installed set recorded before an upgrade using only cached wheels.
+
+    :param snapshot_path: Snapshot to restore, defaults to the most recent one
+    :param max_workers: Number of pip processes run in parallel
+    :return: True if every package was restored.
+    """
+    if snapshot_path is None:
+        snapshots = sorted(glob.glob(os.path.join(SNAPSHOT_DIR, "*.json")))
+        if not snapshots:
+            speak("There is no snapshot to roll back to.")
+            print("There is no snapshot to roll back to.")
+            return False
+        snapshot_path = snapshots[-1]
+    with open(snapshot_path, "r") as f:
+        snapshot = json.load(f)
+    # Restoring another environment's snapshot would uninstall everything it does not list
+    if snapshot.get("prefix") != ENVIRONMENT_PREFIX:
+        speak("That snapshot belongs to another Python environment.")
+        print(f"{snapshot_path} was taken with {snapshot.get('python')}, not in {ENVIRONMENT_PREFIX}.")
+        return False
+
+    current = snapshot_installed_packages()
+    restore = {}
+    unavailable = []
+    for key, info in snapshot["packages"].items():
+        if current.get(key) == info["version"]:
+            continue
+        if info["wheel"] and os.path.exists(info["wheel"]):
+            restore[key] = info["wheel"]
+        else:
+            unavailable.append(f"{key}=={info['version']}")
+    remove = sorted(key for key in current if key not in snapshot["packages"])
+
+    print(f"Rolling back to {snapshot_path}: {len(restore)} to restore, {len(remove)} to remove.")
+    success = not unavailable
+    try:
+        if remove:
+            subprocess.check_call([sys.executable, '-m', 'pip', 'uninstall', '-y'] + remove)
+        # pip itself is restored first so the parallel runs below use a consistent pip
+        if "pip" in restore:
+            _pip_install_wheels([restore.pop("pip")])
+    except subprocess.CalledProcessError as e:
+        speak(f"Rollback failed. Error: {e}")
+        print(f"Rollback failed. Error: {e}")
+        return False
+
+    wheels = sorted(restore.values())
+    chunks = [wheels[i::max_workers] for i in range(max_workers) if wheels[i::max_workers]]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_pip_install_wheels, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except subprocess.CalledProcessError as e:
+                print(f"Failed to restore some packages. Error: {e}")
+                success = False
+
+    for package in unavailable:
+        print(f"No cached wheel for {package}, it was not restored.")
+    if success:
+        speak("Rollback complete.")
+        print("Rollback complete.")
+    else:
+        speak("Rollback finished with errors.")
+        print("Rollback finished with errors.")
+    return success
+
+def _safe_join(base, path):
+    """
+    Joins a URL path below a cache directory, rejecting paths that escape it.
+    """
+    parts = [part for part in path.split("/") if part]
+    separators = [separator for separator in (os.sep, os.altsep, ":") if separator]
+    if not parts or any(part in (".", "..") or any(separator in part for separator in separators)
+                        for part in parts):
+        raise LookupError(path)
+    return os.path.join(base, *parts)
+
+_NETLOC = re.compile(r"^[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*(?::\d{1,5})?$")
+
+def _host_directory(netloc):
+    """
+    Returns the cache directory name of an artifact host, host:port becomes host_port.
+    """
+    if not _NETLOC.match(netloc):
+        raise LookupError(netloc)
+    return netloc.replace(":", "_")
+
+class ProxyIndex:
+    """
+    Caching proxy for a PEP 503/691 simple index and the artifacts it links to.
+    Concurrent misses for the same page or file are fetched from upstream once.
+    """
+
+    def __init__(self, upstream="https://pypi.org", cache_dir=PROXY_CACHE, offline=False, page_ttl=600):
+        """
+        :param upstream: Base URL of the upstream index
+        :param cache_dir: Directory index pages and artifacts are cached in
+        :param offline: Serve from the cache only and never contact upstream
+        :param page_ttl: Seconds a cached index page is served before it is refreshed
+        """
+        self.upstream = upstream.rstrip("/")
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self.page_ttl = page_ttl
+        self.allowed_hosts = {urllib.parse.urlsplit(self.upstream).netloc, "files.pythonhosted.org"}
+        # Hosts artifacts were cached from before, so they can still be served offline
+        files_dir = os.path.join(cache_dir, "files")
+        if os.path.isdir(files_dir):
+            for name in os.listdir(files_dir):
+                self.allowed_hosts.add(re.sub(r"_(\d+)$", r":\1", name))
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def _coalesce(self, key, fetch):
+        """
+        Runs fetch() once for all callers concurrently asking for the same key.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+        if owner:
+            try:
+                future.set_result(fetch())
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+        return future.result()
+
+    def _local_url(self, url, page_url):
+        """
+        Rewrites a link found on an upstream page so it is served by the proxy.
+        """
+        absolute = urllib.parse.urljoin(page_url, url)
+        parts = urllib.parse.urlsplit(absolute)
+        if parts.scheme not in ("http", "https"):
+            return url
+        fragment = f"#{parts.fragment}" if parts.fragment else ""
+        if parts.netloc == urllib.parse.urlsplit(self.upstream).netloc and parts.path.startswith("/simple/"):
+            return parts.path + fragment
+        with self._lock:
+            self.allowed_hosts.add(parts.netloc)
+        return f"/files/{parts.scheme}/{parts.netloc}{parts.path}{fragment}"
+
+    def _rewrite(self, body, page_url, content_type):
+        """
+        Points every artifact link of an index page or JSON document at the proxy.
+        """
+        if "json" not in content_type:
+            return re.sub(r'href="([^"]+)"',
+                          lambda match: f'href="{self._local_url(match.group(1), page_url)}"', body)
+        document = json.loads(body)
+        entries = list(document.get("files", [])) + list(document.get("urls", []))
+        for release_files in document.get("releases", {}).values():
+            entries.extend(release_files)
+        for entry in entries:
+            if "url" in entry:
+                entry["url"] = self._local_url(entry["url"], page_url)
+        return json.dumps(document)
+
+    def get_page(self, path, accept_json=False):
+        """
+        Returns a cached or freshly fetched index page.
+
+        :param path: URL path of the page, e.g. /simple/numpy/ or /pypi/numpy/json
+        :param accept_json: Prefer the PEP 691 JSON form of simple index pages
+        :return: A tuple of the page body and its content type.
+        """
+        kind = "json" if accept_json or path.endswith("/json") else "html"
+        cache_path = os.path.join(_safe_join(os.path.join(self.cache_dir, "pages"), path), f"index.{kind}")
+
+        def read_cached():
+            with open(cache_path, "rb") as f:
+                body = f.read()
+            with open(f"{cache_path}.type", "r") as f:
+                return body, f.read()
+
+        if os.path.exists(f"{cache_path}.type"):
+            if self.offline or time.time() - os.path.getmtime(cache_path) < self.page_ttl:
+                return read_cached()
+        if self.offline:
+            raise LookupError(path)
+
+        def fetch():
+            headers = {"Accept": SIMPLE_JSON if kind == "json" else "text/html"}
+            response = requests.get(f"{self.upstream}{path}", headers=headers, timeout=30)
+            if response.status_code == 404:
+                raise LookupError(path)
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "text/html").split(";")[0].strip()
+            body = self._rewrite(response.text, response.url, content_type).encode("utf-8")
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            temp_path = f"{cache_path}.{threading.get_ident()}.part"
+            with open(temp_path, "wb") as f:
+                f.write(body)
+            os.replace(temp_path, cache_path)
+            with open(f"{cache_path}.type", "w") as f:
+                f.write(content_type)
+            return body, content_type
+
+        return self._coalesce(cache_path, fetch)
+
+    def forward_xmlrpc(self, body):
+        """
+        Passes an XML-RPC call such as changelog_since_serial to the upstream index uncached.
+
+        :param body: The request body
+        :return: A tuple of the status code, response body and content type.
+        """
+        if self.offline:
+            raise LookupError("/pypi")
+        response = requests.post(f"{self.upstream}/pypi", data=body, timeout=60,
+                                 headers={"Content-Type": "text/xml"})
+        return response.status_code, response.content, response.headers.get("Content-Type", "text/xml")
+
+    def get_file(self, scheme, netloc, path):
+        """
+        Returns the path of a cached artifact, streaming it to disk from upstream on a miss.
+
+        :param scheme: Scheme of the original artifact URL
+        :param netloc: Host of the original artifact URL
+        :param path: Path of the original artifact URL
+        :return: Path to the cached file.
+        """
+        with self._lock:
+            allowed = netloc in self.allowed_hosts
+        if not allowed:
+            raise LookupError(netloc)
+        cache_path = _safe_join(os.path.join(self.cache_dir, "files", _host_directory(netloc)), path)
+        if os.path.exists(cache_path):
+            return cache_path
+        if self.offline:
+            raise LookupError(path)
+
+        def fetch():
+            if os.path.exists(cache_path):
+                return cache_path
+            url = f"{scheme}://{netloc}{path}"
+            with requests.get(url, stream=True, timeout=60) as response:
+                if response.status_code == 404:
+                    raise LookupError(path)
+                response.raise_for_status()
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                temp_path = f"{cache_path}.{threading.get_ident()}.part"
+                try:
+                    with open(temp_path, "wb") as f:
+                        for chunk in response.iter_content(chunk_size=1024 * 1024):
+                            f.write(chunk)
+                    os.replace(temp_path, cache_path)
+                finally:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+            return cache_path
+
+        return self._coalesce(cache_path, fetch)
+
+class _ProxyIndexHandler(BaseHTTPRequestHandler):
+    """
+    Serves simple index pages and artifacts from the server's ProxyIndex, and passes XML-RPC calls to upstream.
+    """
+
+    def do_GET(self):
+        index = self.server.index
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        try:
+            if path.startswith("/files/"):
+                scheme, netloc, file_path = (path[len("/files/"):].split("/", 2) + ["", ""])[:3]
+                if scheme not in ("http", "https"):
+                    raise LookupError(path)
+                cache_path = index.get_file(scheme, netloc, "/" + file_path)
+                self.send_file(cache_path)
+            elif path == "/simple" or path.startswith("/simple/") or path.startswith("/pypi/"):
+                if path.startswith("/simple") and not path.endswith("/"):
+                    self.send_response(301)
+                    self.send_header("Location", path + "/")
+                    self.end_headers()
+                    return
+                accept_json = SIMPLE_JSON in self.headers.get("Accept", "")
+                body, content_type = index.get_page(path, accept_json)
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self.send_error(404)
+        except LookupError:
+            self.send_error(404)
+        except requests.RequestException as e:
+            self.send_error(502, str(e))
+
+    def do_POST(self):
+        if urllib.parse.urlsplit(self.path).path.rstrip("/") != "/pypi":
+            self.send_error(404)
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if not 0 < length <= 1 << 20:
+                self.send_error(400)
+                return
+            status, body, content_type = self.server.index.forward_xmlrpc(self.rfile.read(length))
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except ValueError:
+            self.send_error(400)
+        except LookupError:
+            self.send_error(503, "The proxy is offline")
+        except requests.RequestException as e:
+            self.send_error(502, str(e))
+
+    def send_file(self, path):
+        """
+        Sends a cached artifact, or the single byte range the client asked for,
+        so remote wheels can be inspected without downloading them.
+        """
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", self.headers.get("Range", "").strip())
+        if match and (match.group(1) or match.group(2)):
+            if not match.group(1):
+                start = max(size - int(match.group(2)), 0)
+            else:
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            if start >= size or start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(remaining, 1 << 16))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+def serve_proxy_index(host="127.0.0.1", port=3141, upstream="https://pypi.org", offline=False,
+                      cache_dir=PROXY_CACHE):
+    """
+    Creates a caching proxy index server, call serve_forever() on it to start serving.
+
+    :param host: Address to listen on, use 0.0.0.0 to share it with other hosts
+    :param port: Port to listen on, 0 picks a free port
+    :param upstream: Base URL of the upstream index
+    :param offline: Serve from the cache only
+    :param cache_dir: Directory index pages and artifacts are cached in
+    :return: The ThreadingHTTPServer.
+    """
+    server = ThreadingHTTPServer((host, port), _ProxyIndexHandler)
+    server.daemon_threads = True
+    server.index = ProxyIndex(upstream, cache_dir=cache_dir, offline=offline)
+    return server
+
+def use_proxy_index(url):
+    """
+    Points the tool and every pip it starts at a proxy index.
+
+    :param url: Base URL of the proxy index, e.g. http://buildcache:3141
+    """
+    global PYPI_URL
+    PYPI_URL = url.rstrip("/")
+    os.environ["PIP_INDEX_URL"] = f"{PYPI_URL}/simple/"
+
+# Latest versions fetched from the index, kept as {name: (fetched at, version)}
+_latest_versions = {}
+
+def fetch_latest_versions(names, max_age=3600, max_workers=16):
+    """
+    Returns the latest version of each project on the index, fetching the stale ones in parallel.
+
+    :param names: Canonical project names
+    :param max_age: Seconds a fetched version is reused
+    :param max_workers: Number of parallel requests
+    :return: A dictionary mapping names to versions, None for projects the index does not have.
+    """
+    now = time.time()
+    stale = [name for name in names if name not in _latest_versions or now - _latest_versions[name][0] >= max_age]
+
+    def fetch(name):
+        try:
+            response = requests.get(f"{PYPI_URL}/pypi/{name}/json", timeout=10)
+            return response.json()["info"]["version"] if response.status_code == 200 else None
+        except (requests.RequestException, ValueError, KeyError):
+            return None
+
+    if stale:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for name, version in zip(stale, executor.map(fetch, stale)):
+                _latest_versions[name] = (now, version)
+    return {name: _latest_versions[name][1] for name in names}
+
+def find_outdated_packages(max_age=INDEX_WATCH_INTERVAL):
+    """
+    Compares the installed index with the latest versions on the package index.
+    While the latest version table is fresh this is a local join against it, an older
+    table is synced with the index changelog first.
+
+    :param max_age: Seconds since the last sync after which the table is synced again
+    :return: A sorted list of (name, installed version, latest version) tuples.
+    """
+    distributions = get_installed_index().distributions
+    table = get_latest_version_table()
+    names = sorted(distributions)
+    if table.serial is None or time.time() - table.synced_at > max_age:
+        try:
+            table.sync(names)
+        except (OSError, xmlrpc.client.Error) as e:
+            print(f"Could not read the index changelog, fetching latest versions directly: {e}")
+    if table.serial is not None and time.time() - table.synced_at <= max_age:
+        latest = table.lookup(names)
+    else:
+        latest = fetch_latest_versions(names)
+    outdated = []
+    for name, dist in sorted(distributions.items()):
+        if latest[name] and pkg_resources.parse_version(latest[name]) > pkg_resources.parse_version(dist["version"]):
+            outdated.append((name, dist["version"], latest[name]))
+    return outdated
+
+def _changelog_client(timeout):
+    """
+    Returns an XML-RPC client for the index changelog whose connections give up after timeout seconds.
+    """
+    url = f"{PYPI_URL}/pypi"
+    base = xmlrpc.client.SafeTransport if url.startswith("https:") else xmlrpc.client.Transport
+
+    class TimeoutTransport(base):
+        def make_connection(self, host):
+            connection = super().make_connection(host)
+            connection.timeout = timeout
+            return connection
+
+    return xmlrpc.client.ServerProxy(url, transport=TimeoutTransport())
+
+class LatestVersionTable:
+    """
+    Local table of the latest version of each installed project. It is kept current by
+    following the index's changelog serial, so only projects that changed are fetched again.
+    """
+
+    def __init__(self, path=LATEST_VERSIONS_FILE):
+        """
+        :param path: File the table is persisted to
+        """
+        self.path = path
+        self.serial = None
+        self.synced_at = 0.0
+        self.versions = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            self.serial = data["serial"]
+            self.versions = data["versions"]
+            self.synced_at = data.get("synced_at", 0.0)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def save(self):
+        """
+        Writes the table to disk.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.part"
+        with self._lock:
+            with open(temp_path, "w") as f:
+                json.dump({"serial": self.serial, "synced_at": self.synced_at, "versions": self.versions}, f)
+        os.replace(temp_path, self.path)
+
+    def lookup(self, names):
+        """
+        Returns the latest versions of projects, fetching the ones the table does not track yet.
+
+        :param names: Canonical project names
+        :return: A dictionary mapping names to versions, None for projects the index does not have.
+        """
+        missing = [name for name in names if name not in self.versions]
+        if missing:
+            fetched = fetch_latest_versions(missing, max_age=0)
+            with self._lock:
+                self.versions.update(fetched)
+        return {name: self.versions[name] for name in names}
+
+    def sync(self, names, max_gap=100000, timeout=30):
+        """
+        Brings the table up to date with the index changelog.
+
+        :param names: Canonical names of the projects to track
+        :param max_gap: Serials behind the index after which every project is fetched again
+        :param timeout: Seconds to wait for the index's XML-RPC interface
+        :return: A list of the names whose latest version changed.
+        """
+        client = _changelog_client(timeout)
+        last_serial = client.changelog_last_serial()
+        if self.serial is None or last_serial - self.serial > max_gap:
+            stale = list(names)
+        else:
+            changes = client.changelog_since_serial(self.serial)
+            changed = {canonicalize_name(change[0]) for change in changes}
+            last_serial = max([last_serial] + [change[4] for change in changes])
+            stale = [name for name in names if name in changed or name not in self.versions]
+        fetched = fetch_latest_versions(stale, max_age=0) if stale else {}
+        updated = [name for name in stale if self.versions.get(name) != fetched[name]]
+        with self._lock:
+            self.versions.update(fetched)
+            self.serial = last_serial
+            self.synced_at = time.time()
+        self.save()
+        return updated
+
+_latest_version_table = None
+
+def get_latest_version_table():
+    """
+    Returns the shared latest version table.
+    """
+    global _latest_version_table
+    if _latest_version_table is None:
+        _latest_version_table = LatestVersionTable()
+    return _latest_version_table
+
+_watcher_stop = threading.Event()
+
+def start_index_watcher(interval=INDEX_WATCH_INTERVAL, announce=True):
+    """
+    Starts a background thread that follows the index changelog, keeps the latest version
+    table current and announces upgrades that became available.
+
+    :param interval: Seconds between changelog checks
+    :param announce: Speak newly available upgrades
+    :return: The watcher thread, stop it with stop_index_watcher().
+    """
+    _watcher_stop.clear()
+
+    def watch():
+        synced = False
+        while not _watcher_stop.is_set():
+            try:
+                updated = set(get_latest_version_table().sync(sorted(get_installed_index().distributions)))
+                # The first sync only catches up with upgrades the user already knows about
+                new = [name for name, installed, latest in find_outdated_packages() if name in updated] if synced else []
+                synced = True
+                if new:
+                    print(f"\nNew upgrades available: {', '.join(new)}")
+                    if announce:
+                        more = f" and {len(new) - 3} more" if len(new) > 3 else ""
+                        speak(f"New upgrades are available for {', '.join(new[:3])}{more}.")
+            except (OSError, xmlrpc.client.Error) as e:
+                print(f"Index watcher could not reach the index: {e}")
+            _watcher_stop.wait(interval)
+
+    thread = threading.Thread(target=watch, daemon=True)
+    thread.start()
+    return thread
+
+def stop_index_watcher():
+    """
+    Stops the index watcher after its current check.
+    """
+    _watcher_stop.set()
+
+def handle_query(request):
+    """
+    Answers one query of the daemon protocol. The daemon runs it with warm caches,
+    clients without a daemon run it in their own process.
+
+    :param request: A dictionary with a command and its arguments
+    :return: A JSON serializable result.
+    """
+    command = request.get("command")
+    if command == "ping":
+        return "pong"
+    if command == "list":
+        distributions = get_installed_index().distributions
+        return sorted(f"{dist['name']}=={dist['version']}" for dist in distributions.values())
+    if command == "outdated":
+        return find_outdated_packages()
+    if command == "provides":
+        return get_installed_index().provider_of(request["module"])
+    if command == "dependents":
+        return get_installed_index().dependents_of(request["package"])
+    if command == "disk":
+        return get_installed_index().disk_usage(request.get("limit"))
+    if command == "speak":
+        speak(request["text"])
+        return None
+    if command == "listen":
+        return listen()
+    raise LookupError(f"Unknown command {command!r}")
+
+class _DaemonHandler(socketserver.StreamRequestHandler):
+    """
+    Reads one JSON request per line and writes one JSON response per line.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            request = {}
+            try:
+                request = json.loads(line)
+                if request.get("command") == "shutdown":
+                    threading.Thread(target=self.server.shutdown, daemon=True).start()
+                    response = {"ok": True, "result": None}
+                else:
+                    response = {"ok": True, "result": handle_query(request)}
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+def serve_daemon(socket_path=DAEMON_SOCKET):
+    """
+    Creates the resident daemon, call serve_forever() on it to start answering clients.
+    The installed index is refreshed on every request, so changes to site-packages are picked up.
+    The speech engine and the microphone calibration are set up before the first client connects.
+
+    :param socket_path: Path of the Unix domain socket
+    :return: The socket server.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        raise OSError("Unix domain sockets are not available on this platform")
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    if os.path.exists(socket_path):
+        try:
+            daemon_request("ping", socket_path=socket_path, timeout=1)
+            raise OSError(f"A daemon is already listening on {socket_path}")
+        except ConnectionError:
+            os.remove(socket_path)
+    get_installed_index()
+    warm_voice_backends()
+    previous_umask = os.umask(0o077)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(socket_path, _DaemonHandler)
+    finally:
+        os.umask(previous_umask)
+    server.daemon_threads = True
+    return server
+
+def daemon_request(command, socket_path=DAEMON_SOCKET, timeout=None, **arguments):
+    """
+    Sends one request to the resident daemon.
+
+    :param command: The command, e.g. list or outdated
+    :param socket_path: Path of the daemon's Unix domain socket
+    :param timeout: Seconds to wait for the response
+    :raises OSError: If no daemon is listening
+    :raises RuntimeError: If the daemon could not answer the request
+    :return: The result of the command.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall((json.dumps(dict(arguments, command=command)) + "\n").encode("utf-8"))
+        with client.makefile("rb") as reader:
+            response = json.loads(reader.readline())
+    if not response["ok"]:
+        raise RuntimeError(response["error"])
+    return response["result"]
+
+def query(command, use_daemon=True, **arguments):
+    """
+    Runs a query on the resident daemon, or in this process when no daemon is running.
+    """
+    if use_daemon and hasattr(socket, "AF_UNIX") and os.path.exists(DAEMON_SOCKET):
+        try:
+            return daemon_request(command, **arguments)
+        except OSError:
+            pass
+    return handle_query(dict(arguments, command=command))
+
+def benchmark_daemon(runs=10):
+    """
+    Compares the latency of list and outdated answered by the daemon with a cold start of the tool.
+
+    :param runs: Number of times each measurement is repeated
+    :return: A dictionary mapping commands to (cold seconds, warm seconds) medians.
+    """
+    results = {}
+    for command in ("list", "outdated"):
+        cold = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--no-daemon", command],
+                           stdout=subprocess.DEVNULL, check=True)
+            cold.append(time.perf_counter() - start)
+        warm = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            daemon_request(command)
+            warm.append(time.perf_counter() - start)
+        results[command] = (statistics.median(cold), statistics.median(warm))
+        print(f"{command:10} cold start {results[command][0] * 1000:9.1f}ms   "
+              f"daemon {results[command][1] * 1000:9.1f}ms")
+    return results
+
+def _supported_tags():
+    """
+    Returns the wheel tags this interpreter supports, most preferred first.
+    """
+    try:
+        from packaging import tags
+    except ImportError:
+        from pip._vendor.packaging import tags
+    return [str(tag) for tag in tags.sys_tags()]
+
+@functools.lru_cache(maxsize=None)
+def _python_supported(requires_python):
+    """
+    Checks a Requires-Python specifier against this interpreter, specifiers that do not parse are ignored like pip does.
+    """
+    if not requires_python or not requires_python.strip():
+        return True
+    try:
+        requirement = pkg_resources.Requirement.parse(f"python{requires_python.strip()}")
+        return ".".join(map(str, sys.version_info[:3])) in requirement
+    except Exception:
+        return True
+
+def _choose_release(document, requirement):
+    """
+    Picks the version pip would install: the highest release matching the requirement that has
+    files which are not yanked and support this Python, final releases before pre-releases.
+
+    :param document: The project's index JSON document
+    :param requirement: A pkg_resources.Requirement, or None for any version
+    :return: A tuple of (version, usable files), or (None, []) if no release qualifies.
+    """
+    releases = document.get("releases") or {document["info"]["version"]: document.get("urls", [])}
+    candidates = {}
+    for version, files in releases.items():
+        try:
+            if requirement is not None and version not in requirement:
+                continue
+            parsed = pkg_resources.parse_version(version)
+        except ValueError:
+            continue
+        usable = [entry for entry in files if not entry.get("yanked") and _python_supported(entry.get("requires_python"))]
+        if usable:
+            candidates[version] = (parsed, usable)
+    if not candidates:
+        return None, []
+    allow_pre = requirement is not None and requirement.specifier.prereleases
+    finals = [version for version, (parsed, _) in candidates.items() if allow_pre or not parsed.is_prerelease]
+    version = max(finals or candidates, key=lambda version: candidates[version][0])
+    return version, candidates[version][1]
+
+def _select_artifact(files, supported):
+    """
+    Picks the file pip would download from the files of a release.
+
+    :param files: The release's file entries from the index JSON API
+    :param supported: Tags from _supported_tags()
+    :return: The chosen file entry, or None if the release has neither a compatible wheel nor an sdist.
+    """
+    priority = {tag: rank for rank, tag in enumerate(supported)}
+    best = None
+    best_rank = len(priority)
+    sdist = None
+    for entry in files:
+        if entry.get("yanked"):
+            continue
+        filename = entry["filename"]
+        if filename.endswith((".tar.gz", ".zip")) and entry.get("packagetype") == "sdist":
+            sdist = entry
+        if not filename.endswith(".whl"):
+            continue
+        python, abi, platform = filename[:-4].split("-")[-3:]
+        for tag in (f"{p}-{a}-{t}" for p in python.split(".") for a in abi.split(".") for t in platform.split(".")):
+            if priority.get(tag, best_rank) < best_rank:
+                best, best_rank = entry, priority[tag]
+    return best or sdist
+
+def _read_range(url, byte_range):
+    """
+    Reads a byte range of a remote file.
+
+    :return: The bytes, or None if the server ignored the range rather than downloading the whole file.
+    """
+    with _http_session().get(url, headers={"Range": byte_range}, stream=True, timeout=30) as response:
+        if response.status_code != 206:
+            return None
+        return response.content
+
+def _wheel_unpacked_size(url, size):
+    """
+    Reads the central directory of a remote wheel with range requests and sums the
+    uncompressed sizes of its files, without downloading the wheel.
+
+    :return: The unpacked size in bytes, or None if it could not be determined.
+    """
+    try:
+        tail_start = max(size - 65536, 0)
+        tail = _read_range(url, f"bytes={tail_start}-")
+        if tail is None:
+            return None
+        end = tail.rfind(b"PK\x05\x06")
+        if end < 0 or len(tail) != size - tail_start:
+            return None
+        directory_size, directory_offset = struct.unpack("<II", tail[end + 12:end + 20])
+        if directory_offset >= tail_start:
+            directory = tail[directory_offset - tail_start:directory_offset - tail_start + directory_size]
+        else:
+            directory = _read_range(url, f"bytes={directory_offset}-{directory_offset + directory_size - 1}")
+            if directory is None:
+                return None
+        total = 0
+        position = 0
+        while directory[position:position + 4] == b"PK\x01\x02":
+            unpacked, name_length, extra_length, comment_length = struct.unpack(
+                "<I HHH", directory[position + 24:position + 34])
+            if unpacked == 0xFFFFFFFF:
+                return None
+            total += unpacked
+            position += 46 + name_length + extra_length + comment_length
+        return total or None
+    except (requests.RequestException, struct.error):
+        return None
+
+_http_sessions = threading.local()
+
+def _http_session():
+    """
+    Returns a requests session for the current thread, so parallel requests reuse their connections.
+    """
+    if not hasattr(_http_sessions, "session"):
+        _http_sessions.session = requests.Session()
+    return _http_sessions.session
+
+def _fetch_project(name, version=None):
+    """
+    Returns the index JSON document of a project, or of one of its releases, or None if the index does not have it.
+    """
+    path = f"{name}/{version}" if version else name
+    try:
+        response = _http_session().get(f"{PYPI_URL}/pypi/{path}/json", timeout=30)
+        return response.json() if response.status_code == 200 else None
+    except (requests.RequestException, ValueError):
+        return None
+
+def plan_changes(package_list=None, upgrade=False, max_workers=32):
+    """
+    Computes what an install or upgrade would change without installing anything, from
+    index metadata fetched in parallel and the installed index. Releases are chosen like pip
+    does, skipping yanked files and ones whose Requires-Python excludes this interpreter.
+    New dependencies of the chosen releases are followed, version conflicts between them are not resolved.
+
+    :param package_list: Requirements the install would be run with, defaults to packages_to_install
+    :param upgrade: Plan upgrade_packages() instead of an install
+    :param max_workers: Number of parallel metadata requests
+    :return: A dictionary describing the change set and its totals.
+    """
+    distributions = get_installed_index().distributions
+    supported = _supported_tags()
+    if upgrade:
+        requested = {name: None for name in distributions}
+        pip_runs = len(requested)
+    else:
+        package_list = packages_to_install if package_list is None else package_list
+        requested = {}
+        for requirement in package_list:
+            parts = _split_requirement(requirement)
+            if parts and (parts[4] is None or _marker_applies(parts[4])):
+                requested[canonicalize_name(parts[0])] = pkg_resources.Requirement.parse(requirement)
+        pip_runs = len(package_list)
+
+    changes = {}
+    missing = []
+    unsatisfiable = {}
+    pending = list(requested)
+    seen = set(pending)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending:
+            documents = dict(zip(pending, executor.map(_fetch_project, pending)))
+            pending = []
+            chosen = {}
+            for name, document in documents.items():
+                installed = distributions.get(name)
+                requirement = requested.get(name)
+                if installed and not upgrade and (requirement is None or installed["version"] in requirement):
+                    continue
+                if document is None:
+                    missing.append(name)
+                    continue
+                version, files = _choose_release(document, requirement)
+                if version is None:
+                    unsatisfiable[name] = str(requirement) if requirement is not None else f"Python {sys.version.split()[0]}"
+                    continue
+                if installed and pkg_resources.parse_version(version) <= pkg_resources.parse_version(installed["version"]):
+                    continue
+                artifact = _select_artifact(files, supported)
+                changes[name] = {
+                    "name": name,
+                    "installed": installed["version"] if installed else None,
+                    "version": version,
+                    "file": artifact["filename"] if artifact else None,
+                    # Indexes such as the proxy return host-relative file URLs
+                    "url": urllib.parse.urljoin(PYPI_URL, artifact["url"]) if artifact else None,
+                    "download_bytes": artifact["size"] if artifact else 0,
+                    "installed_bytes": installed["size"] if installed else 0,
+                    "sdist": bool(artifact) and not artifact["filename"].endswith(".whl"),
+                }
+                chosen[name] = document if version == document["info"]["version"] else None
+
+            # The project document only carries the metadata of the latest release
+            older = [name for name, document in chosen.items() if document is None]
+            for name, document in zip(older, executor.map(
+                    lambda name: _fetch_project(name, changes[name]["version"]), older)):
+                chosen[name] = document
+            for document in chosen.values():
+                if document is None:
+                    continue
+                for dependency in _applicable_requirements(document["info"].get("requires_dist") or []):
+                    if dependency not in seen and dependency not in distributions:
+                        seen.add(dependency)
+                        pending.append(dependency)
+
+        wheels = [change for change in changes.values() if change["url"] and not change["sdist"]]
+        unpacked = executor.map(lambda change: _wheel_unpacked_size(change["url"], change["download_bytes"]), wheels)
+        for change, size in zip(wheels, unpacked):
+            change["unpacked_bytes"] = size
+    for change in changes.values():
+        if change.get("unpacked_bytes") is None:
+            # Without a readable wheel directory assume a typical compression ratio
+            change["unpacked_bytes"] = int(change["download_bytes"] * 2.5)
+        change["growth_bytes"] = change["unpacked_bytes"] - change["installed_bytes"]
+
+    ordered = sorted(changes.values(), key=lambda change: change["name"])
+    return {
+        "mode": "upgrade" if upgrade else "install",
+        "changes": ordered,
+        "unavailable": sorted(missing),
+        "unsatisfiable": dict(sorted(unsatisfiable.items())),
+        "download_bytes": sum(change["download_bytes"] for change in ordered),
+        "growth_bytes": sum(change["growth_bytes"] for change in ordered),
+        "pip_runs": pip_runs,
+        "builds": sorted(change["name"] for change in ordered if change["sdist"]),
+    }
+
+def print_plan(plan):
+    """
+    Prints a plan from plan_changes() in a human readable form and announces its totals.
+    """
+    print(f"\n{'package':30} {'installed':>14} {'new':>14} {'download':>10} {'growth':>10}")
+    for change in plan["changes"]:
+        print(f"{change['name']:30} {change['installed'] or '-':>14} {change['version']:>14} "
+              f"{change['download_bytes'] / 1024 ** 2:8.1f}MB {change['growth_bytes'] / 1024 ** 2:8.1f}MB"
+              f"{'  sdist build' if change['sdist'] else ''}")
+    for name in plan["unavailable"]:
+        print(f"{name:30} not available on the index")
+    for name, spec in plan["unsatisfiable"].items():
+        print(f"{name:30} no release satisfies {spec}")
+    print(f"\n{len(plan['changes'])} packages change, {plan['download_bytes'] / 1024 ** 2:.1f} MB to download, "
+          f"{plan['growth_bytes'] / 1024 ** 2:+.1f} MB on disk, {plan['pip_runs']} pip runs, "
+          f"{len(plan['builds'])} source builds")
+    speak(f"{len(plan['changes'])} packages would change, downloading "
+          f"{plan['download_bytes'] / 1024 ** 3:.1f} gigabytes with {len(plan['builds'])} source builds.")
 
 def ask_for_another_action():
     """
     Asks the user if they want to perform another action or exit.
+    While a job runs only an explicit no or exit ends the program, silence or a misheard answer keeps it going.
     """
+    if _active_job and _active_job.running():
+        speak("Would you like to perform another action? Say no to cancel the running job and exit.")
+        response = listen()
+        return "no" not in response.split() and "exit" not in response
     speak("Would you like to perform another action? Say yes to continue or no to exit.")
     response = listen()
     return "yes" in response
 
+# Packages the install option installs, also the default input of the plan command
+packages_to_install = [
+    'absl-py',
+    'aenum',
+    'aescipher',
+    'aiofiles',
+    'aiohappyeyeballs',
+    'aiohttp',
+    'aiosignal',
+    'alabaster',
+    'algebra',
+    'altgraph',
+    'amqp',
+    'annotated-types',
+    'ansi2html',
+    'ansimarkup',
+    'anyio',
+    'api',
+    'apiai',
+    'arg',
+    'argcomplete',
+    'argon2-cffi',
+    'argon2-cffi-bindings',
+    'arrow',
+    'artificial',
+    'asgiref',
+    'astropy',
+    'astropy-iers-data',
+    'asttokens',
+    'astunparse',
+    'async',
+    'async-generator',
+    'async-lru',
+    'async-timeout',
+    'asyncio',
+    'attr',
+    'attrs',
+    'audioread',
+    'autocommand',
+    'Automat',
+    'axju-jokes',
+    'babel',
+    'backcall',
+    'backends',
+    'bcrypt',
+    'beartype',
+    'beautifulsoup4',
+    'bing',
+    'bleach',
+    'blinker',
+    'blis',
+    'block-stdout',
+    'bokeh',
+    'boto3',
+    'botocore',
+    'bottle',
+    'bottle-websocket',
+    'bs4',
+    'cachetools',
+    'cairocffi',
+    'CairoSVG',
+    'call',
+    'casttube',
+    'catalogue',
+    'category-encoders',
+    'ccompiler',
+    'cellular',
+    'certifi',
+    'cffi',
+    'cfgv',
+    'chardet',
+    'charset-normalizer',
+    'chatbot',
+    'cheroot',
+    'CherryPy',
+    'click',
+    'clock',
+    'cloudpath',
+    'cloudpathlib',
+    'cloudpickle',
+    'cmake',
+    'colorama',
+    'colorlog',
+    'comm',
+    'commonmark',
+    'complete',
+    'comtypes',
+    'confection',
+    'constantly',
+    'contextlib2',
+    'contourpy',
+    'cortana',
+    'coverage',
+    'cryptography',
+    'css',
+    'cssselect',
+    'cssselect2',
+    'ctypes-callable',
+    'cx_Freeze',
+    'cx_Logging',
+    'cycler',
+    'cymem',
+    'Cython',
+    'dash',
+    'dash-core-components',
+    'dash-html-components',
+    'dash-table',
+    'DateTime',
+    'debugpy',
+    'decorator',
+    'deep-translator',
+    'deepdiff',
+    'defusedxml',
+    'desk',
+    'Distance',
+    'distlib',
+    'distro',
+    'Django',
+    'django-appconf',
+    'django-classy-tags',
+    'django-easy-maps',
+    'dnspython',
+    'docker',
+    'docopt',
+    'docutils',
+    'duty',
+    'EAST',
+    'EasyProcess',
+    'easyrsa',
+    'ecapture',
+    'ecc',
+    'edge-tts',
+    'edith',
+    'email_validator',
+    'encryptedsocket',
+    'entrypoint2',
+    'entrypoints',
+    'exceptiongroup',
+    'exe',
+    'executing',
+    'face_recognition_models',
+    'faddr',
+    'failprint',
+    'fastai',
+    'fastcore',
+    'fastdownload',
+    'fastjsonschema',
+    'fastprogress',
+    'fbchat',
+    'fbchatbot',
+    'fdm',
+    'file-explorer',
+    'filelock',
+    'Flask',
+    'flatbuffers',
+    'fontools',
+    'fonttools',
+    'FORD',
+    'forecast',
+    'fqdn',
+    'freezegun',
+    'friday',
+    'frozenlist',
+    'fsspec',
+    'future',
+    'gast',
+    'gcloud',
+    'geocoder',
+    'geographiclib',
+    'geojson',
+    'geopy',
+    'gevent',
+    'gevent-websocket',
+    'gif',
+    'gitverse',
+    'gmail',
+    'gmail-connector',
+    'google',
+    'google-api-core',
+    'google-api-python-client',
+    'google-auth',
+    'google-auth-httplib2',
+    'google-auth-oauthlib',
+    'google-cloud',
+    'google-cloud-texttospeech',
+    'google-pasta',
+    'google-workspace',
+    'googleapis-common-protos',
+    'googlehomepush',
+    'googlemaps',
+    'googlesearch-python',
+    'googletrans',
+    'graphviz',
+    'greenlet',
+    'grpcio',
+    'grpcio-status',
+    'gTTS',
+    'gTTS-token',
+    'h11',
+    'h2',
+    'h3',
+    'h5py',
+    'hijri',
+    'hijri-converter',
+    'holidays',
+    'hpack',
+    'hstspreload',
+    'html2text',
+    'httpcore',
+    'httplib2',
+    'httpsx',
+    'httpx',
+    'huggingface-hub',
+    'hyperframe',
+    'hyperlink',
+    'icalendar',
+    'identify',
+    'idna',
+    'ifaddr',
+    'image',
+    'imageai',
+    'imageio',
+    'imagesize',
+    'imbalanced-learn',
+    'importlib-metadata',
+    'importlib_resources',
+    'incremental',
+    'inflect',
+    'iniconfig',
+    'instagram',
+    'intel-cmplr-lib-ur',
+    'intel-openmp',
+    'intelligence',
+    'ipdb',
+    'ipykernel',
+    'ipython',
+    'ipython-genutils',
+    'ipywidgets',
+    'isodate',
+    'isoduration',
+    'itemadapter',
+    'itemloaders',
+    'itsdangerous',
+    'jaraco.classes',
+    'jaraco.collections',
+    'jaraco.context',
+    'jaraco.functools',
+    'jaraco.text',
+    'javascript',
+    'jax',
+    'jaxlib',
+    'jedi',
+    'Jinja2',
+    'jiter',
+    'jmespath',
+    'joblib',
+    'Js2Py',
+    'json5',
+    'jsonpointer',
+    'jsonschema',
+    'jsonschema-specifications',
+    'jupyter',
+    'jupyter_client',
+    'jupyter-console',
+    'jupyter_core',
+    'jupyter-events',
+    'jupyter-lsp',
+    'jupyter_server',
+    'jupyter_server_terminals',
+    'jupyterlab',
+    'jupyterlab_pygments',
+    'jupyterlab_server',
+    'jupyterlab_widgets',
+    'keras',
+    'Keras-Applications',
+    'Keras-Preprocessing',
+    'keyboard',
+    'keyring',
+    'keyrings.alt',
+    'Kivy',
+    'kivy-deps.angle',
+    'kivy-deps.glew',
+    'kivy-deps.sdl2',
+    'Kivy-Garden',
+    'kiwisolver',
+    'kombu',
+    'korean-lunar-calendar',
+    'kubernetes',
+    'langcodes',
+    'langdetect',
+    'language_data',
+    'lazy_loader',
+    'lazyme',
+    'libclang',
+    'libretranslatepy',
+    'librosa',
+    'lief',
+    'lightgbm',
+    'linkedin',
+    'llvmlite',
+    'locket',
+    'loguru',
+    'lxml',
+    'macholib',
+    'maps',
+    'marisa-trie',
+    'Markdown',
+    'markdown-include',
+    'markdown-it-py',
+    'MarkupSafe',
+    'marshmallow',
+    'mashumaro',
+    'matplotlib',
+    'matplotlib-inline',
+    'mdurl',
+    'mediapipe',
+    'messenger',
+    'meteostat',
+    'microphone',
+    'microsoft',
+    'mistune',
+    'mkl',
+    'ml-dtypes',
+    'mlpack',
+    'modulegraph',
+    'more-itertools',
+    'mouse',
+    'MouseInfo',
+    'mpmath',
+    'msgpack',
+    'mss',
+    'multidict',
+    'munch',
+    'murmurhash',
+    'namex',
+    'nbclient',
+    'nbconvert',
+    'nbformat',
+    'nest-asyncio',
+    'network',
+    'networkx',
+    'newsapi',
+    'newsapi-python',
+    'nh3',
+    'nltk',
+    'nodeenv',
+    'noneprompt',
+    'north',
+    'nose',
+    'notebook',
+    'notebook_shim',
+    'notify2',
+    'nox',
+    'numba',
+    'numpy',
+    'oauth2',
+    'oauth2client',
+    'oauthlib',
+    'of',
+    'omnitools',
+    'onedrive',
+    'openai',
+    'openai-whisper',
+    'opencv-contrib-python',
+    'opencv-python',
+    'opt-einsum',
+    'optree',
+    'ordered-set',
+    'orderly-set',
+    'orjson',
+    'outcome',
+    'overrides',
+    'packaging',
+    'paho-mqtt',
+    'panda',
+    'pandas',
+    'pandocfilters',
+    'paramiko',
+    'paramiko-expect',
+    'parse',
+    'parsedatetime',
+    'parsel',
+    'parso',
+    'partd',
+    'pathlib_abc',
+    'pathlib2',
+    'pathy',
+    'patsy',
+    'pcpp',
+    'pdfminer.six',
+    'pdfplumber',
+    'pefile',
+    'pi',
+    'pick',
+    'pickleshare',
+    'pillow',
+    'pip',
+    'pipwin',
+    'pkce',
+    'pkginfo',
+    'platformdirs',
+    'playsound',
+    'plotly',
+    'plotly-resampler',
+    'pluggy',
+    'pluginmanager',
+    'plum-dispatch',
+    'plyer',
+    'pmdarima',
+    'pooch',
+    'portalocker',
+    'portend',
+    'pre-commit',
+    'preshed',
+    'prometheus_client',
+    'prompt_toolkit',
+    'Protego',
+    'proto-plus',
+    'protobuf',
+    'psutil',
+    'pure_eval',
+    'pvporcupine',
+    'py',
+    'py-avataaars',
+    'py2app',
+    'py3-tts',
+    'pyarrow',
+    'pyasn1',
+    'pyasn1_modules',
+    'pyasynchat',
+    'pyasyncore',
+    'PyAudio',
+    'PyAutoGUI',
+    'pyavatar',
+    'PyBrain',
+    'pybrightness',
+    'pycaw',
+    'PyChromecast',
+    'pycontrols',
+    'pycountry',
+    'pycparser',
+    'pycryptodome',
+    'pycw',
+    'pyda',
+    'pydantic',
+    'pydantic_core',
+    'pydantic-settings',
+    'PyDirectInput',
+    'PyDispatcher',
+    'pydub',
+    'pyerfa',
+    'pyfaidx',
+    'pyfnutils',
+    'pyftpdlib',
+    'pygame',
+    'pygeocoder',
+    'PyGetWindow',
+    'Pygments',
+    'pyicloud',
+    'pyinput',
+    'pyinstaller',
+    'pyinstaller-hooks-contrib',
+    'pyjokes',
+    'pyjsparser',
+    'PyJWT',
+    'pylance',
+    'pymongo',
+    'PyMsgBox',
+    'pymyq',
+    'PyNaCl',
+    'pynotification',
+    'pynput',
+    'pyOpenSSL',
+    'pyotp',
+    'pyowm',
+    'pyparsing',
+    'pypdfium2',
+    'pyperclip',
+    'pypinyin',
+    'pypiwin32',
+    'PyPrind',
+    'pypsutil',
+    'PyQt5',
+    'PyQt5-Qt5',
+    'PyQt5_sip',
+    'PyRect',
+    'pyrh',
+    'pyrsistent',
+    'pyscreenshot',
+    'PyScreeze',
+    'pySmartDL',
+    'PySocks',
+    'pytest',
+    'pytest-cov',
+    'python-dateutil',
+    'python-dotenv',
+    'python-env',
+    'python-json-logger',
+    'python-magic',
+    'python-markdown-math',
+    'python-multipart',
+    'python-weather',
+    'pytils',
+    'pyttsx3',
+    'pytube',
+    'pytweening',
+    'pytz',
+    'PyWavelets',
+    'pywebostv',
+    'pywhatkit',
+    'pywifi-controls',
+    'pywin32',
+    'pywin32-ctypes',
+    'pywinpty',
+    'pywslocker',
+    'PyYAML',
+    'pyzmq',
+    'qtconsole',
+    'QtPy',
+    'queuelib',
+    'randfacts',
+    'ratelim',
+    'readme_renderer',
+    'recommonmark',
+    'referencing',
+    'regex',
+    'requests',
+    'requests-file',
+    'requests-oauthlib',
+    'requests-toolbelt',
+    'retrying',
+    'rfc3339-validator',
+    'rfc3986',
+    'rfc3986-validator',
+    'rgb',
+    'rich',
+    'rise',
+    'rpds-py',
+    'rsa',
+    'rse',
+    's3transfer',
+    'safetensors',
+    'schedule',
+    'schemdraw',
+    'scikit-base',
+    'scikit-image',
+    'scikit-learn',
+    'scikit-plot',
+    'scipy',
+    'Scrapy',
+    'seaborn',
+    'selenium',
+    'Send2Trash',
+    'service-identity',
+    'setuptools',
+    'shellingham',
+    'shutup',
+    'simplejson',
+    'six',
+    'sktime',
+    'smart-open',
+    'sniffio',
+    'snowballstemmer',
+    'sortedcontainers',
+    'sounddevice',
+    'soundfile',
+    'soupsieve',
+    'South',
+    'soxr',
+    'spacy',
+    'spacy-legacy',
+    'spacy-loggers',
+    'SpeechRecognition',
+    'speedtest-cli',
+    'Sphinx',
+    'sphinx-automodapi',
+    'sphinxcontrib-applehelp',
+    'sphinxcontrib-devhelp',
+    'sphinxcontrib-htmlhelp',
+    'sphinxcontrib-jsmath',
+    'sphinxcontrib-qthelp',
+    'sphinxcontrib-serializinghtml',
+    'SQLAlchemy',
+    'sqlparse',
+    'srsly',
+    'stack-data',
+    'starlette',
+    'statsmodels',
+    'style',
+    'sympy',
+    'tbats',
+    'tbb',
+    'tempora',
+    'tenacity',
+    'tensorboard',
+    'tensorboard-data-server',
+    'tensorboard-plugin-wit',
+    'tensorflow',
+    'tensorflow-estimator',
+    'tensorflow-gpu-estimator',
+    'tensorflow-intel',
+    'termcolor',
+    'terminado',
+    'testpath',
+    'testtools',
+    'thinc',
+    'think',
+    'threadpoolctl',
+    'threadwrapper',
+    'tifffile',
+    'tiktoken',
+    'timezonefinder',
+    'tinycss2',
+    'tldextract',
+    'to',
+    'tokenizers',
+    'tomli',
+    'tony',
+    'tools',
+    'toolz',
+    'toposort',
+    'torch',
+    'torchvision',
+    'tornado',
+    'tqdm',
+    'traitlets',
+    'transformers',
+    'translate',
+    'trio',
+    'trio-websocket',
+    'trython',
+    'tsdownsample',
+    'ttp',
+    'twine',
+    'Twisted',
+    'twisted-iocpsupport',
+    'twitter',
+    'typeguard',
+    'typer',
+    'types-python-dateutil',
+    'typing_extensions',
+    'tzdata',
+    'tzlocal',
+    'unencryptedsocket',
+    'update',
+    'uri-template',
+    'uritemplate',
+    'urllib3',
+    'uvicorn',
+    'vehicle',
+    'vexmessage',
+    'vine',
+    'virtualenv',
+    'Voice',
+    'voices',
+    'volume-control',
+    'vpn-server',
+    'w3lib',
+    'wasabi',
+    'Wave',
+    'wcwidth',
+    'weasel',
+    'webcolors',
+    'webencodings',
+    'websocket-client',
+    'websockets',
+    'webull',
+    'Werkzeug',
+    'wheel',
+    'whichcraft',
+    'widgetsnbextension',
+    'wikipedia',
+    'win32-setctime',
+    'windows',
+    'windows-curses',
+    'winshell',
+    'WMI',
+    'wolframalpha',
+    'wrapt',
+    'ws4py',
+    'wsproto',
+    'wxPython',
+    'xgboost',
+    'xmltodict',
+    'xxhash',
+    'xyzservices',
+    'yarl',
+    'yellowbrick',
+    'zc.lockfile',
+    'zeroconf',
+    'zipp',
+    'zope.event',
+    'zope.interface',
+    'zstandard',
+]
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Python PIP Package tool")
+    parser.add_argument("--index", default=os.environ.get("PIP_TOOLS_INDEX"),
+                        help="Base URL of a proxy index to use instead of pypi.org")
+    parser.add_argument("--no-daemon", action="store_true", help="Answer queries without the resident daemon")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("daemon", help="Run the resident daemon with warm caches")
+    watch_parser = commands.add_parser("watch", help="Follow the index changelog and report new upgrades")
+    watch_parser.add_argument("--interval", type=int, default=INDEX_WATCH_INTERVAL, help="Seconds between changelog checks")
+    commands.add_parser("list", help="List installed packages")
+    commands.add_parser("outdated", help="List installed packages with newer versions on the index")
+    benchmark_parser = commands.add_parser("benchmark", help="Compare daemon latency with a cold start")
+    benchmark_parser.add_argument("--runs", type=int, default=10)
+    plan_parser = commands.add_parser("plan", help="Preview what an install or upgrade would change")
+    plan_parser.add_argument("packages", nargs="*", help="Requirements to plan, defaults to the stored packages")
+    plan_parser.add_argument("--upgrade", action="store_true", help="Plan an upgrade of all installed packages")
+    plan_parser.add_argument("--json", action="store_true", help="Print the plan as JSON")
+    requirements_parser = commands.add_parser("requirements", help="Install or preview a requirements file")
+    requirements_parser.add_argument("file", nargs="?")
+    requirements_parser.add_argument("--dry-run", action="store_true", help="Print what would be installed")
+    requirements_parser.add_argument("--benchmark", action="store_true", help="Parse a generated 50k line tree")
+    proxy_parser = commands.add_parser("proxy", help="Run a caching proxy index")
+    proxy_parser.add_argument("--host", default="127.0.0.1")
+    proxy_parser.add_argument("--port", type=int, default=3141)
+    proxy_parser.add_argument("--upstream", default="https://pypi.org")
+    proxy_parser.add_argument("--offline", action="store_true", help="Serve from the cache only")
+    provides_parser = commands.add_parser("provides", help="Show which package provides a module")
+    provides_parser.add_argument("module")
+    dependents_parser = commands.add_parser("dependents", help="List the packages depending on a package")
+    dependents_parser.add_argument("package")
+    commands.add_parser("disk", help="List the packages using the most disk space")
+    commands.add_parser("profile", help="Rank installed packages by import time")
+    prune_parser = commands.add_parser("prune", help="Find installed packages a project does not import")
+    prune_parser.add_argument("project", nargs="?", default=os.getcwd())
+    prune_parser.add_argument("--uninstall", action="store_true", help="Uninstall the unused packages")
+    args = parser.parse_args()
+
+    if args.index:
+        use_proxy_index(args.index)
+    if args.command == "proxy":
+        server = serve_proxy_index(args.host, args.port, args.upstream, args.offline)
+        print(f"Serving proxy index of {args.upstream} on http://{args.host}:{server.server_port}/simple/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+        sys.exit(0)
+    elif args.command == "watch":
+        try:
+            start_index_watcher(args.interval, announce=False).join()
+        except KeyboardInterrupt:
+            stop_index_watcher()
+        sys.exit(0)
+    elif args.command == "daemon":
+        server = serve_daemon()
+        start_index_watcher(announce=False)
+        print(f"Daemon listening on {DAEMON_SOCKET}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        server.server_close()
+        os.remove(DAEMON_SOCKET)
+        sys.exit(0)
+    elif args.command == "list":
+        for package in query("list", use_daemon=not args.no_daemon):
+            print(package)
+        sys.exit(0)
+    elif args.command == "outdated":
+        for name, installed, latest in query("outdated", use_daemon=not args.no_daemon):
+            print(f"{name} {installed} -> {latest}")
+        sys.exit(0)
+    elif args.command == "benchmark":
+        benchmark_daemon(args.runs)
+        sys.exit(0)
+    elif args.command == "plan":
+        plan = plan_changes(args.packages or None, upgrade=args.upgrade)
+        if args.json:
+            print(json.dumps(plan, indent=1))
+        else:
+            print_plan(plan)
+        sys.exit(0)
+    elif args.command == "requirements":
+        if args.benchmark:
+            benchmark_requirements_parser()
+        elif args.file is None:
+            requirements_parser.error("a requirements file is required")
+        elif args.dry_run:
+            requirements, constraints, options = parse_requirements_file(args.file)
+            print(" ".join(options))
+            for requirement in requirements:
+                print(requirement)
+            for constraint in constraints:
+                print(f"{constraint}  # constraint")
+        else:
+            install_packages([], requirements_file=args.file)
+        sys.exit(0)
+    elif args.command == "provides":
+        sys.exit(0 if find_package_for_module(args.module) else 1)
+    elif args.command == "dependents":
+        list_dependents(args.package)
+        sys.exit(0)
+    elif args.command == "disk":
+        list_disk_usage()
+        sys.exit(0)
+    elif args.command == "profile":
+        profile_import_times()
+        sys.exit(0)
+    elif args.command == "prune":
+        prune_packages(args.project, args.uninstall)
+        sys.exit(0)
+
+    start_index_watcher()
     while True:
         speak("Please choose an option.")
         print("Please choose an option:")
         print("Display {Lists installed packages}")
         print("Upgrade {Upgrades installed packages")
         print("Install {Installs stored packages}}")
+        print("Rollback {Restores packages from before the last upgrade}")
+        print("Provides {Finds the package that provides a module}")
+        print("Dependents {Lists the packages depending on a package}")
+        print("Disk {Lists the packages using the most disk space}")
+        print("Profile {Ranks installed packages by import time}")
+        print("Prune {Removes packages the current project does not use}")
+        print("Status {Reports the progress of a running install or upgrade}")
+        print("Cancel {Stops a running install or upgrade}")
+        print("Plan {Previews what installing the stored packages would change}")
 
         choice = listen()
         
-        if "display" in choice:
+        if "status" in choice:
+            pip_job_status()
+        elif "plan" in choice:
+            print_plan(plan_changes())
+        elif "cancel" in choice:
+            cancel_pip_job()
+        elif "display" in choice:
             list_installed_packages()
         elif "upgrade" in choice:
-            speak("The process will take several minutes, feel free to keep using your computer.")
-            upgrade_packages()
+            upgrade_pip = False
+            if check_pip_version():
+                speak("Would you like to upgrade pip now?")
+                upgrade_pip = "yes" in listen()
+            if start_pip_job("Upgrading", len(list(pkg_resources.working_set)), upgrade_packages, upgrade_pip, "deferred"):
+                speak("The process will take several minutes, say status or cancel at any time.")
+        elif "rollback" in choice:
+            if not refuse_while_job_runs():
+                rollback_packages()
+        elif "provides" in choice:
+            speak("Which module?")
+            module = listen().replace(" ", "_")
+            if module:
+                find_package_for_module(module)
+        elif "dependents" in choice:
+            speak("Which package?")
+            package = listen().replace(" ", "-")
+            if package:
+                list_dependents(package)
+        elif "disk" in choice:
+            list_disk_usage()
+        elif "profile" in choice:
+            if not refuse_while_job_runs():
+                profile_import_times()
+        elif "prune" in choice:
+            if not refuse_while_job_runs() and prune_packages(os.getcwd()):
+                speak("Would you like to uninstall them now?")
+                if "yes" in listen() and not refuse_while_job_runs():
+                    prune_packages(os.getcwd(), uninstall=True)
         elif "install" in choice:
-            speak("The process will take several minutes, feel free to keep using your computer.")
-            # Example usage
-            packages_to_install = [
-                'absl-py',
-                'aenum',
-                'aescipher',
-                'aiofiles',
-                'aiohappyeyeballs',
-                'aiohttp',
-                'aiosignal',
-                'alabaster',
-                'algebra',
-                'altgraph',
-                'amqp',
-                'annotated-types',
-                'ansi2html',
-                'ansimarkup',
-                'anyio',
-                'api',
-                'apiai',
-                'arg',
-                'argcomplete',
-                'argon2-cffi',
-                'argon2-cffi-bindings',
-                'arrow',
-                'artificial',
-                'asgiref',
-                'astropy',
-                'astropy-iers-data',
-                'asttokens',
-                'astunparse',
-                'async',
-                'async-generator',
-                'async-lru',
-                'async-timeout',
-                'asyncio',
-                'attr',
-                'attrs',
-                'audioread',
-                'autocommand',
-                'Automat',
-                'axju-jokes',
-                'babel',
-                'backcall',
-                'backends',
-                'bcrypt',
-                'beartype',
-                'beautifulsoup4',
-                'bing',
-                'bleach',
-                'blinker',
-                'blis',
-                'block-stdout',
-                'bokeh',
-                'boto3',
-                'botocore',
-                'bottle',
-                'bottle-websocket',
-                'bs4',
-                'cachetools',
-                'cairocffi',
-                'CairoSVG',
-                'call',
-                'casttube',
-                'catalogue',
-                'category-encoders',
-                'ccompiler',
-                'cellular',
-                'certifi',
-                'cffi',
-                'cfgv',
-                'chardet',
-                'charset-normalizer',
-                'chatbot',
-                'cheroot',
-                'CherryPy',
-                'click',
-                'clock',
-                'cloudpath',
-                'cloudpathlib',
-                'cloudpickle',
-                'cmake',
-                'colorama',
-                'colorlog',
-                'comm',
-                'commonmark',
-                'complete',
-                'comtypes',
-                'confection',
-                'constantly',
-                'contextlib2',
-                'contourpy',
-                'cortana',
-                'coverage',
-                'cryptography',
-                'css',
-                'cssselect',
-                'cssselect2',
-                'ctypes-callable',
-                'cx_Freeze',
-                'cx_Logging',
-                'cycler',
-                'cymem',
-                'Cython',
-                'dash',
-                'dash-core-components',
-                'dash-html-components',
-                'dash-table',
-                'DateTime',
-                'debugpy',
-                'decorator',
-                'deep-translator',
-                'deepdiff',
-                'defusedxml',
-                'desk',
-                'Distance',
-                'distlib',
-                'distro',
-                'Django',
-                'django-appconf',
-                'django-classy-tags',
-                'django-easy-maps',
-                'dnspython',
-                'docker',
-                'docopt',
-                'docutils',
-                'duty',
-                'EAST',
-                'EasyProcess',
-                'easyrsa',
-                'ecapture',
-                'ecc',
-                'edge-tts',
-                'edith',
-                'email_validator',
-                'encryptedsocket',
-                'entrypoint2',
-                'entrypoints',
-                'exceptiongroup',
-                'exe',
-                'executing',
-                'face_recognition_models',
-                'faddr',
-                'failprint',
-                'fastai',
-                'fastcore',
-                'fastdownload',
-                'fastjsonschema',
-                'fastprogress',
-                'fbchat',
-                'fbchatbot',
-                'fdm',
-                'file-explorer',
-                'filelock',
-                'Flask',
-                'flatbuffers',
-                'fontools',
-                'fonttools',
-                'FORD',
-                'forecast',
-                'fqdn',
-                'freezegun',
-                'friday',
-                'frozenlist',
-                'fsspec',
-                'future',
-                'gast',
-                'gcloud',
-                'geocoder',
-                'geographiclib',
-                'geojson',
-                'geopy',
-                'gevent',
-                'gevent-websocket',
-                'gif',
-                'gitverse',
-                'gmail',
-                'gmail-connector',
-                'google',
-                'google-api-core',
-                'google-api-python-client',
-                'google-auth',
-                'google-auth-httplib2',
-                'google-auth-oauthlib',
-                'google-cloud',
-                'google-cloud-texttospeech',
-                'google-pasta',
-                'google-workspace',
-                'googleapis-common-protos',
-                'googlehomepush',
-                'googlemaps',
-                'googlesearch-python',
-                'googletrans',
-                'graphviz',
-                'greenlet',
-                'grpcio',
-                'grpcio-status',
-                'gTTS',
-                'gTTS-token',
-                'h11',
-                'h2',
-                'h3',
-                'h5py',
-                'hijri',
-                'hijri-converter',
-                'holidays',
-                'hpack',
-                'hstspreload',
-                'html2text',
-                'httpcore',
-                'httplib2',
-                'httpsx',
-                'httpx',
-                'huggingface-hub',
-                'hyperframe',
-                'hyperlink',
-                'icalendar',
-                'identify',
-                'idna',
-                'ifaddr',
-                'image',
-                'imageai',
-                'imageio',
-                'imagesize',
-                'imbalanced-learn',
-                'importlib-metadata',
-                'importlib_resources',
-                'incremental',
-                'inflect',
-                'iniconfig',
-                'instagram',
-                'intel-cmplr-lib-ur',
-                'intel-openmp',
-                'intelligence',
-                'ipdb',
-                'ipykernel',
-                'ipython',
-                'ipython-genutils',
-                'ipywidgets',
-                'isodate',
-                'isoduration',
-                'itemadapter',
-                'itemloaders',
-                'itsdangerous',
-                'jaraco.classes',
-                'jaraco.collections',
-                'jaraco.context',
-                'jaraco.functools',
-                'jaraco.text',
-                'javascript',
-                'jax',
-                'jaxlib',
-                'jedi',
-                'Jinja2',
-                'jiter',
-                'jmespath',
-                'joblib',
-                'Js2Py',
-                'json5',
-                'jsonpointer',
-                'jsonschema',
-                'jsonschema-specifications',
-                'jupyter',
-                'jupyter_client',
-                'jupyter-console',
-                'jupyter_core',
-                'jupyter-events',
-                'jupyter-lsp',
-                'jupyter_server',
-                'jupyter_server_terminals',
-                'jupyterlab',
-                'jupyterlab_pygments',
-                'jupyterlab_server',
-                'jupyterlab_widgets',
-                'keras',
-                'Keras-Applications',
-                'Keras-Preprocessing',
-                'keyboard',
-                'keyring',
-                'keyrings.alt',
-                'Kivy',
-                'kivy-deps.angle',
-                'kivy-deps.glew',
-                'kivy-deps.sdl2',
-                'Kivy-Garden',
-                'kiwisolver',
-                'kombu',
-                'korean-lunar-calendar',
-                'kubernetes',
-                'langcodes',
-                'langdetect',
-                'language_data',
-                'lazy_loader',
-                'lazyme',
-                'libclang',
-                'libretranslatepy',
-                'librosa',
-                'lief',
-                'lightgbm',
-                'linkedin',
-                'llvmlite',
-                'locket',
-                'loguru',
-                'lxml',
-                'macholib',
-                'maps',
-                'marisa-trie',
-                'Markdown',
-                'markdown-include',
-                'markdown-it-py',
-                'MarkupSafe',
-                'marshmallow',
-                'mashumaro',
-                'matplotlib',
-                'matplotlib-inline',
-                'mdurl',
-                'mediapipe',
-                'messenger',
-                'meteostat',
-                'microphone',
-                'microsoft',
-                'mistune',
-                'mkl',
-                'ml-dtypes',
-                'mlpack',
-                'modulegraph',
-                'more-itertools',
-                'mouse',
-                'MouseInfo',
-                'mpmath',
-                'msgpack',
-                'mss',
-                'multidict',
-                'munch',
-                'murmurhash',
-                'namex',
-                'nbclient',
-                'nbconvert',
-                'nbformat',
-                'nest-asyncio',
-                'network',
-                'networkx',
-                'newsapi',
-                'newsapi-python',
-                'nh3',
-                'nltk',
-                'nodeenv',
-                'noneprompt',
-                'north',
-                'nose',
-                'notebook',
-                'notebook_shim',
-                'notify2',
-                'nox',
-                'numba',
-                'numpy',
-                'oauth2',
-                'oauth2client',
-                'oauthlib',
-                'of',
-                'omnitools',
-                'onedrive',
-                'openai',
-                'openai-whisper',
-                'opencv-contrib-python',
-                'opencv-python',
-                'opt-einsum',
-                'optree',
-                'ordered-set',
-                'orderly-set',
-                'orjson',
-                'outcome',
-                'overrides',
-                'packaging',
-                'paho-mqtt',
-                'panda',
-                'pandas',
-                'pandocfilters',
-                'paramiko',
-                'paramiko-expect',
-                'parse',
-                'parsedatetime',
-                'parsel',
-                'parso',
-                'partd',
-                'pathlib_abc',
-                'pathlib2',
-                'pathy',
-                'patsy',
-                'pcpp',
-                'pdfminer.six',
-                'pdfplumber',
-                'pefile',
-                'pi',
-                'pick',
-                'pickleshare',
-                'pillow',
-                'pip',
-                'pipwin',
-                'pkce',
-                'pkginfo',
-                'platformdirs',
-                'playsound',
-                'plotly',
-                'plotly-resampler',
-                'pluggy',
-                'pluginmanager',
-                'plum-dispatch',
-                'plyer',
-                'pmdarima',
-                'pooch',
-                'portalocker',
-                'portend',
-                'pre-commit',
-                'preshed',
-                'prometheus_client',
-                'prompt_toolkit',
-                'Protego',
-                'proto-plus',
-                'protobuf',
-                'psutil',
-                'pure_eval',
-                'pvporcupine',
-                'py',
-                'py-avataaars',
-                'py2app',
-                'py3-tts',
-                'pyarrow',
-                'pyasn1',
-                'pyasn1_modules',
-                'pyasynchat',
-                'pyasyncore',
-                'PyAudio',
-                'PyAutoGUI',
-                'pyavatar',
-                'PyBrain',
-                'pybrightness',
-                'pycaw',
-                'PyChromecast',
-                'pycontrols',
-                'pycountry',
-                'pycparser',
-                'pycryptodome',
-                'pycw',
-                'pyda',
-                'pydantic',
-                'pydantic_core',
-                'pydantic-settings',
-                'PyDirectInput',
-                'PyDispatcher',
-                'pydub',
-                'pyerfa',
-                'pyfaidx',
-                'pyfnutils',
-                'pyftpdlib',
-                'pygame',
-                'pygeocoder',
-                'PyGetWindow',
-                'Pygments',
-                'pyicloud',
-                'pyinput',
-                'pyinstaller',
-                'pyinstaller-hooks-contrib',
-                'pyjokes',
-                'pyjsparser',
-                'PyJWT',
-                'pylance',
-                'pymongo',
-                'PyMsgBox',
-                'pymyq',
-                'PyNaCl',
-                'pynotification',
-                'pynput',
-                'pyOpenSSL',
-                'pyotp',
-                'pyowm',
-                'pyparsing',
-                'pypdfium2',
-                'pyperclip',
-                'pypinyin',
-                'pypiwin32',
-                'PyPrind',
-                'pypsutil',
-                'PyQt5',
-                'PyQt5-Qt5',
-                'PyQt5_sip',
-                'PyRect',
-                'pyrh',
-                'pyrsistent',
-                'pyscreenshot',
-                'PyScreeze',
-                'pySmartDL',
-                'PySocks',
-                'pytest',
-                'pytest-cov',
-                'python-dateutil',
-                'python-dotenv',
-                'python-env',
-                'python-json-logger',
-                'python-magic',
-                'python-markdown-math',
-                'python-multipart',
-                'python-weather',
-                'pytils',
-                'pyttsx3',
-                'pytube',
-                'pytweening',
-                'pytz',
-                'PyWavelets',
-                'pywebostv',
-                'pywhatkit',
-                'pywifi-controls',
-                'pywin32',
-                'pywin32-ctypes',
-                'pywinpty',
-                'pywslocker',
-                'PyYAML',
-                'pyzmq',
-                'qtconsole',
-                'QtPy',
-                'queuelib',
-                'randfacts',
-                'ratelim',
-                'readme_renderer',
-                'recommonmark',
-                'referencing',
-                'regex',
-                'requests',
-                'requests-file',
-                'requests-oauthlib',
-                'requests-toolbelt',
-                'retrying',
-                'rfc3339-validator',
-                'rfc3986',
-                'rfc3986-validator',
-                'rgb',
-                'rich',
-                'rise',
-                'rpds-py',
-                'rsa',
-                'rse',
-                's3transfer',
-                'safetensors',
-                'schedule',
-                'schemdraw',
-                'scikit-base',
-                'scikit-image',
-                'scikit-learn',
-                'scikit-plot',
-                'scipy',
-                'Scrapy',
-                'seaborn',
-                'selenium',
-                'Send2Trash',
-                'service-identity',
-                'setuptools',
-                'shellingham',
-                'shutup',
-                'simplejson',
-                'six',
-                'sktime',
-                'smart-open',
-                'sniffio',
-                'snowballstemmer',
-                'sortedcontainers',
-                'sounddevice',
-                'soundfile',
-                'soupsieve',
-                'South',
-                'soxr',
-                'spacy',
-                'spacy-legacy',
-                'spacy-loggers',
-                'SpeechRecognition',
-                'speedtest-cli',
-                'Sphinx',
-                'sphinx-automodapi',
-                'sphinxcontrib-applehelp',
-                'sphinxcontrib-devhelp',
-                'sphinxcontrib-htmlhelp',
-                'sphinxcontrib-jsmath',
-                'sphinxcontrib-qthelp',
-                'sphinxcontrib-serializinghtml',
-                'SQLAlchemy',
-                'sqlparse',
-                'srsly',
-                'stack-data',
-                'starlette',
-                'statsmodels',
-                'style',
-                'sympy',
-                'tbats',
-                'tbb',
-                'tempora',
-                'tenacity',
-                'tensorboard',
-                'tensorboard-data-server',
-                'tensorboard-plugin-wit',
-                'tensorflow',
-                'tensorflow-estimator',
-                'tensorflow-gpu-estimator',
-                'tensorflow-intel',
-                'termcolor',
-                'terminado',
-                'testpath',
-                'testtools',
-                'thinc',
-                'think',
-                'threadpoolctl',
-                'threadwrapper',
-                'tifffile',
-                'tiktoken',
-                'timezonefinder',
-                'tinycss2',
-                'tldextract',
-                'to',
-                'tokenizers',
-                'tomli',
-                'tony',
-                'tools',
-                'toolz',
-                'toposort',
-                'torch',
-                'torchvision',
-                'tornado',
-                'tqdm',
-                'traitlets',
-                'transformers',
-                'translate',
-                'trio',
-                'trio-websocket',
-                'trython',
-                'tsdownsample',
-                'ttp',
-                'twine',
-                'Twisted',
-                'twisted-iocpsupport',
-                'twitter',
-                'typeguard',
-                'typer',
-                'types-python-dateutil',
-                'typing_extensions',
-                'tzdata',
-                'tzlocal',
-                'unencryptedsocket',
-                'update',
-                'uri-template',
-                'uritemplate',
-                'urllib3',
-                'uvicorn',
-                'vehicle',
-                'vexmessage',
-                'vine',
-                'virtualenv',
-                'Voice',
-                'voices',
-                'volume-control',
-                'vpn-server',
-                'w3lib',
-                'wasabi',
-                'Wave',
-                'wcwidth',
-                'weasel',
-                'webcolors',
-                'webencodings',
-                'websocket-client',
-                'websockets',
-                'webull',
-                'Werkzeug',
-                'wheel',
-                'whichcraft',
-                'widgetsnbextension',
-                'wikipedia',
-                'win32-setctime',
-                'windows',
-                'windows-curses',
-                'winshell',
-                'WMI',
-                'wolframalpha',
-                'wrapt',
-                'ws4py',
-                'wsproto',
-                'wxPython',
-                'xgboost',
-                'xmltodict',
-                'xxhash',
-                'xyzservices',
-                'yarl',
-                'yellowbrick',
-                'zc.lockfile',
-                'zeroconf',
-                'zipp',
-                'zope.event',
-                'zope.interface',
-                'zstandard',
-            ]
-            install_packages(packages_to_install)
+            if start_pip_job("Installing", len(packages_to_install), install_packages, packages_to_install, None, "deferred"):
+                speak("The process will take several minutes, say status or cancel at any time.")
         else:
             speak("I didn't understand your choice. Please try again.")
 
         if not ask_for_another_action():
+            if _active_job and _active_job.running():
+                cancel_pip_job()
             #speak("Exiting the program. Goodbye!")
             print("Exiting the program. Goodbye!")
             break
@@ -0,0 +1,163 @@
+"""
+Syncs the latest version table against a local stand-in index with a synthetic changelog.
+"""
+
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from socketserver import ThreadingMixIn
+from unittest import mock
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import PIP_Tools
+
+class _IndexHandler(SimpleXMLRPCRequestHandler):
+    """
+    Answers XML-RPC changelog calls on /pypi and JSON project documents on /pypi/<name>/json.
+    """
+    rpc_paths = ("/pypi",)
+
+    def do_GET(self):
+        index = self.server.index
+        parts = self.path.strip("/").split("/")
+        with index.lock:
+            index.fetches.append(parts[1] if len(parts) == 3 else self.path)
+            version = index.versions.get(parts[1]) if len(parts) == 3 and parts[2] == "json" else None
+        if version is None:
+            self.send_error(404)
+            return
+        body = json.dumps({"info": {"name": parts[1], "version": version}, "releases": {}}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class _StandInIndex(ThreadingMixIn, SimpleXMLRPCServer):
+    """
+    Package index whose changelog is edited by the tests through release().
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), requestHandler=_IndexHandler, logRequests=False, allow_none=True)
+        self.index = self
+        self.lock = threading.Lock()
+        self.serial = 100
+        self.changelog = []
+        self.versions = {"alpha": "1.0", "beta": "2.0", "gamma": "3.0"}
+        self.fetches = []
+        self.register_function(lambda: self.serial, "changelog_last_serial")
+        self.register_function(
+            lambda since: [entry for entry in self.changelog if entry[4] > since], "changelog_since_serial")
+
+    def release(self, name, version):
+        with self.lock:
+            self.serial += 1
+            self.versions[name] = version
+            self.changelog.append([name, version, int(time.time()), "new release", self.serial])
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+class LatestVersionTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.state_dir, "latest.json")
+        self.index = _StandInIndex()
+        threading.Thread(target=self.index.serve_forever, daemon=True).start()
+        index_url = mock.patch.object(PIP_Tools, "PYPI_URL", self.index.url)
+        index_url.start()
+        self.addCleanup(index_url.stop)
+        self.names = ["alpha", "beta", "gamma"]
+
+    def tearDown(self):
+        self.index.shutdown()
+        self.index.server_close()
+        shutil.rmtree(self.state_dir, ignore_errors=True)
+
+    def test_first_sync_fetches_every_project(self):
+        table = PIP_Tools.LatestVersionTable(self.path)
+        self.assertEqual(sorted(table.sync(self.names)), self.names)
+        self.assertEqual(table.serial, 100)
+        self.assertEqual(table.versions, {"alpha": "1.0", "beta": "2.0", "gamma": "3.0"})
+        self.assertEqual(sorted(self.index.fetches), self.names)
+
+    def test_later_syncs_only_fetch_changed_projects(self):
+        table = PIP_Tools.LatestVersionTable(self.path)
+        table.sync(self.names)
+        self.index.fetches.clear()
+        self.index.release("beta", "2.1")
+        self.index.release("unrelated", "9.0")
+        self.assertEqual(table.sync(self.names), ["beta"])
+        self.assertEqual(self.index.fetches, ["beta"])
+        self.assertEqual(table.versions["beta"], "2.1")
+        self.assertEqual(table.serial, 102)
+        self.index.fetches.clear()
+        self.assertEqual(table.sync(self.names), [])
+        self.assertEqual(self.index.fetches, [])
+
+    def test_table_is_persisted(self):
+        table = PIP_Tools.LatestVersionTable(self.path)
+        table.sync(self.names)
+        reloaded = PIP_Tools.LatestVersionTable(self.path)
+        self.assertEqual(reloaded.serial, table.serial)
+        self.assertEqual(reloaded.versions, table.versions)
+        self.assertAlmostEqual(reloaded.synced_at, table.synced_at)
+
+    def test_large_gap_fetches_everything_again(self):
+        table = PIP_Tools.LatestVersionTable(self.path)
+        table.sync(self.names)
+        self.index.fetches.clear()
+        self.index.serial += 1000
+        table.sync(self.names, max_gap=500)
+        self.assertEqual(sorted(self.index.fetches), self.names)
+
+    def test_stale_table_is_synced_before_outdated_is_answered(self):
+        table = PIP_Tools.LatestVersionTable(self.path)
+        table.sync(self.names)
+        self.index.release("alpha", "1.5")
+        installed = mock.Mock(distributions={name: {"version": "1.0"} for name in self.names})
+        with mock.patch.object(PIP_Tools, "get_installed_index", return_value=installed), \
+                mock.patch.object(PIP_Tools, "get_latest_version_table", return_value=table):
+            self.assertNotIn(("alpha", "1.0", "1.5"), PIP_Tools.find_outdated_packages(max_age=60))
+            table.synced_at -= 120
+            self.assertIn(("alpha", "1.0", "1.5"), PIP_Tools.find_outdated_packages(max_age=60))
+
+    def test_sync_through_the_proxy_index(self):
+        proxy = PIP_Tools.serve_proxy_index(port=0, upstream=self.index.url, cache_dir=self.state_dir)
+        threading.Thread(target=proxy.serve_forever, daemon=True).start()
+        try:
+            with mock.patch.object(PIP_Tools._ProxyIndexHandler, "log_message"), \
+                    mock.patch.object(PIP_Tools, "PYPI_URL", f"http://127.0.0.1:{proxy.server_port}"):
+                table = PIP_Tools.LatestVersionTable(self.path)
+                self.assertEqual(sorted(table.sync(self.names)), self.names)
+                self.assertEqual(table.serial, 100)
+        finally:
+            proxy.shutdown()
+            proxy.server_close()
+
+    def test_unresponsive_index_times_out(self):
+        with socket.socket() as silent:
+            silent.bind(("127.0.0.1", 0))
+            silent.listen()
+            with mock.patch.object(PIP_Tools, "PYPI_URL", f"http://127.0.0.1:{silent.getsockname()[1]}"):
+                start = time.monotonic()
+                with self.assertRaises(OSError):
+                    PIP_Tools.LatestVersionTable(self.path).sync(self.names, timeout=0.5)
+                self.assertLess(time.monotonic() - start, 5)
+
+if __name__ == "__main__":
+    unittest.main()
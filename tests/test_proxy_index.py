@@ -0,0 +1,126 @@
+"""
+Runs the caching proxy index against a second local server standing in for the upstream index.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import PIP_Tools
+
+WHEEL = bytes(range(256)) * 64
+
+class _UpstreamHandler(BaseHTTPRequestHandler):
+    """
+    Serves one project page and the wheel it links to, slowly enough for misses to overlap.
+    """
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+        if self.path == "/simple/demo/":
+            body = (f'<a href="http://127.0.0.1:{server.server_port}/packages/demo-1.0-py3-none-any.whl'
+                    f'#sha256=00">demo-1.0-py3-none-any.whl</a>').encode("utf-8")
+            content_type = "text/html"
+        elif self.path == "/packages/demo-1.0-py3-none-any.whl":
+            time.sleep(0.3)
+            body = WHEEL
+            content_type = "application/octet-stream"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class ProxyIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.upstream = ThreadingHTTPServer(("127.0.0.1", 0), _UpstreamHandler)
+        self.upstream.daemon_threads = True
+        self.upstream.lock = threading.Lock()
+        self.upstream.hits = {}
+        self.proxy = PIP_Tools.serve_proxy_index(port=0, upstream=f"http://127.0.0.1:{self.upstream.server_port}",
+                                                 cache_dir=self.cache_dir)
+        logging = mock.patch.object(PIP_Tools._ProxyIndexHandler, "log_message")
+        logging.start()
+        self.addCleanup(logging.stop)
+        for server in (self.upstream, self.proxy):
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.proxy.server_port}"
+
+    def tearDown(self):
+        for server in (self.proxy, self.upstream):
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def wheel_url(self):
+        page = requests.get(f"{self.base}/simple/demo/", timeout=10)
+        self.assertEqual(page.status_code, 200)
+        link = page.text.split('href="', 1)[1].split('"', 1)[0]
+        self.assertTrue(link.startswith(f"/files/http/127.0.0.1:{self.upstream.server_port}/"), link)
+        return self.base + link.split("#", 1)[0]
+
+    def test_concurrent_misses_fetch_upstream_once(self):
+        url = self.wheel_url()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            bodies = list(executor.map(lambda _: requests.get(url, timeout=10).content, range(8)))
+        self.assertTrue(all(body == WHEEL for body in bodies))
+        self.assertEqual(self.upstream.hits["/packages/demo-1.0-py3-none-any.whl"], 1)
+
+    def test_pages_are_cached(self):
+        self.wheel_url()
+        self.wheel_url()
+        self.assertEqual(self.upstream.hits["/simple/demo/"], 1)
+
+    def test_byte_ranges(self):
+        url = self.wheel_url()
+        response = requests.get(url, headers={"Range": "bytes=-10"}, timeout=10)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, WHEEL[-10:])
+        self.assertEqual(response.headers["Content-Range"], f"bytes {len(WHEEL) - 10}-{len(WHEEL) - 1}/{len(WHEEL)}")
+        response = requests.get(url, headers={"Range": "bytes=100-199"}, timeout=10)
+        self.assertEqual(response.content, WHEEL[100:200])
+        response = requests.get(url, headers={"Range": f"bytes={len(WHEEL)}-"}, timeout=10)
+        self.assertEqual(response.status_code, 416)
+
+    def test_rejects_unknown_hosts_and_traversal(self):
+        self.wheel_url()
+        port = self.upstream.server_port
+        for path in ("/files/http/evil.example/demo.whl",
+                     f"/files/http/127.0.0.1:{port}/%2e%2e/%2e%2e/secret",
+                     f"/files/http/127.0.0.1:{port}/packages/a%5cb.whl",
+                     "/files/file/127.0.0.1/etc/passwd"):
+            self.assertEqual(requests.get(self.base + path, timeout=10).status_code, 404, path)
+        written = [os.path.relpath(os.path.join(root, name), self.cache_dir)
+                   for root, dirs, files in os.walk(self.cache_dir) for name in files]
+        self.assertTrue(all(path.startswith("pages" + os.sep) for path in written), written)
+
+    def test_offline_serves_the_cache(self):
+        url = self.wheel_url()
+        requests.get(url, timeout=10)
+        self.proxy.index.offline = True
+        self.upstream.shutdown()
+        self.assertEqual(requests.get(url, timeout=10).content, WHEEL)
+        self.assertEqual(requests.get(f"{self.base}/simple/other/", timeout=10).status_code, 404)
+
+if __name__ == "__main__":
+    unittest.main()